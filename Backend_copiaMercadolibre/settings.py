@@ -49,11 +49,38 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # orjson-backed when it is installed, DRF's stdlib JSON otherwise.
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Keyset pagination used by the catalog, order and cart item list endpoints.
+# Clients may ask for a smaller/larger page with ?page_size= up to the cap.
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 20))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 100))
+
+# Totals for ?count=1 on list endpoints and the admin (api.counts): filtered
+# lists are counted exactly; whole tables too below EXACT_BELOW rows, with
+# pg_class.reltuples or a cached count above.
+ROW_COUNTS = {
+    'EXACT_BELOW': int(os.getenv('ROW_COUNTS_EXACT_BELOW', 10_000)),
+    'CACHE_TIMEOUT': 60,
 }
 
+# Threads available to async views for sync-only work (e.g. authentication).
+# 0 runs that work thread-sensitively on the request's own thread.
+ASYNC_SYNC_WORKERS = int(os.getenv('ASYNC_SYNC_WORKERS', 32))
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -63,15 +90,40 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.UserTokenRefreshSerializer',
 }
 
+# Seconds a user's token version/role/active flag is cached for revocation
+# checks. 0 disables the check: token claims are trusted until they expire.
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', 60))
+
 AUTH_USER_MODEL = 'api.User'
+
+# login_view authenticates by email with one lookup (api.authentication).
+AUTHENTICATION_BACKENDS = [
+    'api.authentication.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Token buckets checked per client IP and per email before hashing a login
+# password: (capacity, tokens refilled per second). BACKEND 'cache' shares
+# them across workers, 'local' keeps them per process. Only failed logins
+# count against an email. The client IP is taken from X-Forwarded-For when
+# the request comes through one of TRUSTED_PROXIES (comma-separated CIDRs).
+LOGIN_RATE_LIMIT = {
+    'BACKEND': os.getenv('LOGIN_RATE_LIMIT_BACKEND', 'cache'),
+    'IP': (20, 0.2),
+    'ACCOUNT': (5, 1 / 60),
+    'TRUSTED_PROXIES': [net.strip() for net in os.getenv('TRUSTED_PROXIES', '').split(',') if net.strip()],
+}
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
     'http://localhost:8000',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
+    'api.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -80,8 +132,23 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.replicas.ReplicaPinMiddleware',
 ]
 
+# Share of requests profiled by api.metrics (queries, DB/view/render time,
+# N+1 detection). Results go to Server-Timing headers and /api/metrics/.
+REQUEST_METRICS = {
+    'SAMPLE_RATE': float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', 0.1)),
+    'N_PLUS_ONE_THRESHOLD': 3,
+    'SERVER_TIMING': True,
+}
+
+# api.compression: zstd/brotli (when their packages are installed) or gzip,
+# for JSON/NDJSON/text bodies of at least MIN_SIZE bytes and all streams.
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', 1024)),
+}
+
 ROOT_URLCONF = 'Backend_copiaMercadolibre.urls'
 
 TEMPLATES = [
@@ -108,19 +175,83 @@ WSGI_APPLICATION = 'Backend_copiaMercadolibre.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # Persistent connections, checked before reuse so a connection the
+        # server dropped is replaced instead of failing the request.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas: comma-separated hosts (database files with SQLite). They are
+# mirrors of default in tests. Routed by api.replicas.
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    location = 'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'
+    DATABASES[f'replica{index}'] = dict(
+        DATABASES['default'], **{location: replica.strip()}, TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+READ_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': int(os.getenv('DB_STICKY_SECONDS', 5)),
+}
+
+
+# Cache
+# The product response cache keeps a small in-process LRU in front of this
+# shared backend. Set REDIS_URL in production so all workers share it.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+PRODUCT_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCAL_MAX_ENTRIES': 1024,
+    'VERSION_TTL': 1.0,
+    'LOCK_TIMEOUT': 5.0,
+    # Stock changes reach cached catalog pages within this many seconds.
+    'COALESCE_SECONDS': 5.0,
+}
+
+# Seconds the dashboard keeps a computed range; rollups change on every order.
+DASHBOARD_CACHE_TTL = 60
+DASHBOARD_MAX_PERIODS = 400
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# PBKDF2 cost for new hashes. Existing hashes with a different count are
+# transparently re-hashed on the user's next successful login.
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 0)) or None
+
+PASSWORD_HASHERS = [
+    'api.hashers.ConfiguredPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -151,6 +282,15 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded product images are resized into WebP variants by a background
+# thread pool (api.images) once the upload transaction commits.
+IMAGE_PROCESSING = {
+    'WORKERS': int(os.getenv('IMAGE_WORKERS', 2)),
+    'WIDTHS': (160, 480, 960),
+    'QUALITY': 80,
+    'ALWAYS_EAGER': False,
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
@@ -1,55 +1,107 @@
 from django.contrib import admin
+from .counts import EstimatedCountPaginator
 from .models import Product, ProductImage, Order, User, Cart, CartItem
 
+
+class LargeTableAdmin:
+    """
+    Changelist settings for tables with millions of rows: the unfiltered
+    page count is estimated (see api.counts), and the unfiltered total is
+    not counted again next to a filtered one.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class BoundedValuesFilter(admin.SimpleListFilter):
+    """
+    list_filter over the first `limit` distinct values of `field`, in order,
+    instead of every distinct value in the table.
+    """
+    field = None
+    limit = 50
+
+    def lookups(self, request, model_admin):
+        values = (model_admin.get_queryset(request).order_by(self.field)
+                  .values_list(self.field, flat=True).distinct()[:self.limit])
+        return [(value, value) for value in values]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(**{self.field: self.value()})
+
+
+def bounded_filter(field, title, limit=50):
+    return type(f'{field.title()}Filter', (BoundedValuesFilter,), {
+        'field': field, 'title': title, 'parameter_name': field, 'limit': limit,
+    })
+
+
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1
 
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ('code','name', 'price', 'brand','category','quantity','updated_at','created_at')
     search_fields = ('name','code')
-    list_filter = ('created_at','name','category','brand')
-    ordering = ('-created_at',)
+    list_filter = ('created_at', bounded_filter('category', 'categoría'), bounded_filter('brand', 'marca'))
+    # Matches product_created_id_idx; with the pk in it no '-pk' is appended.
+    ordering = ('-created_at', 'id')
     inlines = [ProductImageInline]
-    
-class OrderAdmin(admin.ModelAdmin):
+
+class ProductImageAdmin(LargeTableAdmin, admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'is_main')
+    list_select_related = ('product',)
+    list_filter = ('status', 'is_main')
+    autocomplete_fields = ('product',)
+
+class OrderAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ('product', 'quantity', 'total', 'date')
-    search_fields = ('product',)
-    list_filter = ( 'created_at','product__name')
-    ordering = ('-created_at',)
+    list_select_related = ('product',)
+    search_fields = ('=product__code',)
+    list_filter = ('created_at',)
+    autocomplete_fields = ('product',)
+    ordering = ('-created_at', 'id')
 
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
 # ...
 
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(LargeTableAdmin, BaseUserAdmin):
     list_display = ('username', 'email', 'role', 'is_staff', 'is_active', 'created_at')
     search_fields = ('username', 'email', 'first_name', 'last_name')
     list_filter = ('role', 'is_staff', 'is_active', 'created_at')
-    ordering = ('-created_at',)
-    
+    ordering = ('-created_at', 'id')
+
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Custom Fields', {'fields': ('role', 'date_birth')}),
     )
     add_fieldsets = BaseUserAdmin.add_fieldsets + (
         ('Custom Fields', {'fields': ('role', 'date_birth', 'email')}),
     )
-    
-class CartAdmin(admin.ModelAdmin):
+
+class CartAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ('user', 'created_at', 'updated_at')
+    list_select_related = ('user',)
     search_fields = ('user__username',)
-    ordering = ('-created_at',)
-    
-class CartItemAdmin(admin.ModelAdmin):
+    autocomplete_fields = ('user',)
+    ordering = ('-created_at', 'id')
+
+class CartItemAdmin(LargeTableAdmin, admin.ModelAdmin):
     list_display = ('cart', 'product', 'quantity')
+    list_select_related = ('cart__user', 'product')
     search_fields = ('cart__user__username', 'product__name')
-    ordering = ('-cart__created_at', '-cart__updated_at')
+    autocomplete_fields = ('cart', 'product')
+    # The line's own created_at (cartitem_created_id_idx), not the cart's
+    # through a join.
+    ordering = ('-created_at', 'id')
 
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(User, UserAdmin)
 admin.site.register(Cart, CartAdmin)
 admin.site.register(CartItem, CartItemAdmin)
-admin.site.register(ProductImage)
+admin.site.register(ProductImage, ProductImageAdmin)
 
 # Register your models here.
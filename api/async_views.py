@@ -0,0 +1,151 @@
+"""
+Async (ASGI-native) versions of the catalog and cart hot paths.
+
+These mirror ProductViewSet list/retrieve and CartViewSet list/create but
+await the database through Django's async ORM instead of holding a worker
+thread per request. Pieces that only exist as sync code (DRF/JWT
+authentication, the cart line upsert) run on a bounded thread pool through
+`run_sync`.
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import services
+from .models import Cart, Product
+from .pagination import KeysetPagination
+from .querysets import optimize_queryset
+from .renderers import FastJSONRenderer
+from .serializers import CartItemSerializer, CartSerializer, ProductSerializer
+
+_executors = {}
+
+
+def get_executor():
+    workers = getattr(settings, 'ASYNC_SYNC_WORKERS', 32)
+    if not workers:
+        return None
+    if workers not in _executors:
+        _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='async-bridge')
+    return _executors[workers]
+
+
+def run_sync(func):
+    """
+    Wrap a sync callable for use from async code on the bounded pool.
+    Pool threads are not tied to a request, so stale DB connections are
+    released around every call. With ASYNC_SYNC_WORKERS = 0 this falls back
+    to Django's thread-sensitive mode (the request's own thread).
+    """
+    executor = get_executor()
+    if executor is None:
+        return sync_to_async(func)
+
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False, executor=executor)
+
+
+def render(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def api_errors(view):
+    """Turn DRF exceptions raised inside an async view into JSON responses."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except APIException as e:
+            return render({"detail": e.detail}, status=e.status_code)
+    return wrapper
+
+
+def drf_request(request):
+    return Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+
+
+async def authenticate(request):
+    """Run the configured DRF authenticators off the event loop."""
+    user = await run_sync(lambda: request.user)()
+    if not user or not user.is_authenticated:
+        raise NotAuthenticated()
+    return user
+
+
+@require_GET
+@api_errors
+async def product_list(request):
+    request = drf_request(request)
+    paginator = KeysetPagination()
+    queryset = optimize_queryset(Product.objects.all(), ProductSerializer)
+    page = await paginator.apaginate_queryset(queryset, request)
+    data = ProductSerializer(page, many=True, context={'request': request}).data
+    return render(paginator.get_paginated_response(data).data)
+
+
+@require_GET
+@api_errors
+async def product_detail(request, pk):
+    request = drf_request(request)
+    queryset = optimize_queryset(Product.objects.all(), ProductSerializer)
+    try:
+        product = await queryset.aget(pk=pk)
+    except Product.DoesNotExist:
+        raise NotFound("No encontrado.")
+    return render(ProductSerializer(product, context={'request': request}).data)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@api_errors
+async def cart(request):
+    request = drf_request(request)
+    user = await authenticate(request)
+    if request.method == 'POST':
+        return await add_to_cart(request, user)
+
+    queryset = optimize_queryset(Cart.objects.with_totals(), CartSerializer)
+    if user.role not in ['ADMIN', 'STAFF']:
+        queryset = queryset.filter(user=user)
+    carts = [cart async for cart in queryset.order_by('id')]
+    return render(CartSerializer(carts, many=True, context={'request': request}).data)
+
+
+async def add_to_cart(request, user):
+    product_id = request.data.get('product_id') or request.data.get('product')
+    if not product_id:
+        return render({"detail": "El Codigo del producto es requerido."}, status=400)
+    try:
+        quantity = int(request.data.get('quantity', 1))
+        if quantity <= 0:
+            return render({"detail": "La cantidad debe ser mayor a 0."}, status=400)
+    except (ValueError, TypeError):
+        return render({"detail": "La cantidad debe ser un número válido."}, status=400)
+
+    user_cart, _ = await Cart.objects.aget_or_create(user=user)
+    try:
+        item, created = await run_sync(services.add_to_cart)(user_cart, product_id, quantity)
+    except Product.DoesNotExist:
+        raise NotFound("No encontrado.")
+    except services.OutOfStock as e:
+        return render({"detail": str(e), "product": e.product_id, "available": e.available}, status=400)
+    return render(CartItemSerializer(item).data, status=201 if created else 200)
@@ -0,0 +1,136 @@
+"""
+Stateless JWT authentication.
+
+Tokens issued by `UserRefreshToken.for_user` carry the user's role and
+token version as signed claims, so `ClaimsJWTAuthentication` can build
+`request.user` without loading the row. Revocation works by comparing
+those claims with a small TTL cache of each user's current state
+(`JWT_USER_CACHE_TTL` seconds, 0 trusts the claims until expiry).
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+# Claim name -> User field. These fields are loaded on request.user;
+# any other field is fetched lazily on first access.
+USER_CLAIMS = {
+    'username': 'username',
+    'role': 'role',
+    'is_staff': 'is_staff',
+    'is_superuser': 'is_superuser',
+    'ver': 'token_version',
+}
+
+
+def state_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def get_user_state(user_id):
+    """`(token_version, role, is_active)` for a user, or None if it is gone."""
+    ttl = getattr(settings, 'JWT_USER_CACHE_TTL', 60)
+    key = state_cache_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        row = User.objects.filter(pk=user_id).values_list('token_version', 'role', 'is_active').first()
+        state = tuple(row) if row else ()
+        cache.set(key, state, ttl)
+    return state or None
+
+
+def forget_user_state(user_id):
+    cache.delete(state_cache_key(user_id))
+
+
+class UserRefreshToken(RefreshToken):
+    """Refresh token carrying USER_CLAIMS; access tokens copy them."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, field in USER_CLAIMS.items():
+            token[claim] = getattr(user, field)
+        return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Build request.user from the token claims instead of the database.
+
+    Tokens without the claims (issued before they existed) fall back to the
+    regular lookup.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if getattr(settings, 'JWT_USER_CACHE_TTL', 60):
+            state = get_user_state(user_id)
+            if state is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            version, role, is_active = state
+            if not is_active:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            if version != validated_token['ver'] or role != validated_token['role']:
+                raise AuthenticationFailed("El token ha sido revocado.", code="token_revoked")
+
+        # from_db marks every other field as deferred, so reading e.g.
+        # user.email still works (one query) and save() only writes these.
+        loaded = {field: validated_token[claim] for claim, field in USER_CLAIMS.items()}
+        loaded.update(id=user_id, is_active=True)
+        fields = [f.attname for f in User._meta.concrete_fields if f.attname in loaded]
+        return User.from_db(router.db_for_read(User), fields, [loaded[name] for name in fields])
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh against the current user row: rejects revoked refresh tokens and
+    issues access tokens with up to date claims (e.g. after a role change).
+    """
+
+    def validate(self, attrs):
+        refresh = UserRefreshToken(attrs['refresh'])
+        user = User.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'], 'no_active_account',
+            )
+        if 'ver' in refresh and refresh['ver'] != user.token_version:
+            raise AuthenticationFailed("El token ha sido revocado.", code="token_revoked")
+        return {'access': str(UserRefreshToken.for_user(user).access_token)}
+
+
+class EmailBackend(ModelBackend):
+    """
+    Password login by email with a single indexed lookup.
+
+    Unknown emails return without running the dummy hash ModelBackend uses
+    to equalise timing: signup already reveals whether an email is taken, and
+    login_view rate-limits attempts, so the hash would only burn CPU.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get(email=email)
+        except User.DoesNotExist:
+            return None
+        # check_password() re-hashes and saves when the hasher policy changed.
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
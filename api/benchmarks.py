@@ -0,0 +1,195 @@
+import asyncio
+import math
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.db import connection, connections
+from django.urls import URLPattern, URLResolver
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    total = sum(samples)
+    return {
+        'count': len(samples),
+        'rps': len(samples) / total if total else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000 if samples else 0.0,
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def route_names(patterns):
+    """Names of every route in a urlpatterns list, including nested includes."""
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def measure(call, repeat, setup=None):
+    """
+    Profile `call()` (returning an HTTP response): latency summary, median
+    query count and last status over `repeat` runs, plus the peak traced
+    memory of one extra run (tracemalloc slows calls down, so it is kept out
+    of the timed runs). `setup()`, if given, runs untimed before each call.
+    """
+    samples, queries = [], []
+    response = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with CaptureQueriesContext(connection) as captured:
+            elapsed, response = timed(call)
+        samples.append(elapsed)
+        queries.append(len(captured))
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return dict(
+        summarize(samples),
+        queries=int(statistics.median(queries)),
+        peak_kib=round(peak / 1024, 1),
+        status=response.status_code,
+    )
+
+
+# Growth below these absolute amounts is treated as noise.
+NOISE_FLOOR = {'p50_ms': 0.5, 'peak_kib': 16.0}
+
+
+def compare(baseline, current, tolerance):
+    """
+    Regressions of `current` against `baseline` route results. Query counts
+    must not grow and statuses must match; p50 latency and peak memory may
+    grow by `tolerance` (a fraction) or NOISE_FLOOR, whichever is larger.
+    Returns a list of human-readable problems.
+    """
+    problems = []
+    for name, before in baseline.items():
+        after = current.get(name)
+        if after is None:
+            problems.append(f"{name}: no longer measured")
+            continue
+        if after['status'] != before['status']:
+            problems.append(f"{name}: status {before['status']} -> {after['status']}")
+        if after['queries'] > before['queries']:
+            problems.append(f"{name}: queries {before['queries']} -> {after['queries']}")
+        for metric, floor in NOISE_FLOOR.items():
+            if after[metric] - before[metric] > max(before[metric] * tolerance, floor):
+                problems.append(f"{name}: {metric} {before[metric]:.2f} -> {after[metric]:.2f}")
+    return problems
+
+
+@contextmanager
+def isolated_database(using='default', keepdb=False):
+    """
+    Run a benchmark against a throwaway test database (test_<NAME>) so
+    synthetic fixtures never touch real data.
+    """
+    connection = connections[using]
+    old_name = connection.settings_dict['NAME']
+    # Allows the test client ('testserver' host) to be used for HTTP-level runs.
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    headers = {}
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        headers[name.strip().lower()] = value.strip()
+    if b'content-length' in headers:
+        await reader.readexactly(int(headers[b'content-length']))
+    elif headers.get(b'transfer-encoding') == b'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    return status, headers.get(b'connection') != b'close'
+
+
+async def _connection(host, port, request, count, samples, errors):
+    reader = writer = None
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append('connection')
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        samples.append(time.perf_counter() - start)
+        if status >= 400:
+            errors.append(status)
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(url, concurrency, total, headers=()):
+    """
+    Drive `total` GET requests at `url` over `concurrency` keep-alive
+    connections. Returns `(samples, errors, elapsed)`, with samples being
+    per-request latencies in seconds and `elapsed` the wall-clock time.
+    """
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    lines = [f"GET {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: keep-alive", *headers]
+    request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    samples, errors = [], []
+    per_connection, extra = divmod(total, concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _connection(parts.hostname, parts.port or 80, request,
+                    per_connection + (1 if i < extra else 0), samples, errors)
+        for i in range(concurrency)
+    ))
+    return samples, errors, time.perf_counter() - start
@@ -0,0 +1,134 @@
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .cache import product_cache
+from .cards import sync_cards
+from .models import Product
+from .serializers import ProductRowSerializer
+
+PRODUCT_COLUMNS = ('code', 'name', 'brand', 'price', 'quantity', 'description', 'category')
+UPSERT_FIELDS = ('name', 'brand', 'price', 'quantity', 'description', 'category', 'updated_at')
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    imported: int = 0
+    rejected: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield `(line_number, dict)` pairs from a text stream without reading it
+    all into memory. Malformed NDJSON lines are yielded as `None`.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+
+def _flush(batch, report):
+    validator = ProductRowSerializer()
+    products = {}
+    for line_number, row in batch:
+        try:
+            data = validator.run_validation(row)
+        except ValidationError as e:
+            report.rejected.append({'line': line_number, 'errors': e.detail})
+            continue
+        # Last occurrence wins: PostgreSQL refuses to upsert the same key
+        # twice in one statement.
+        products[data['code']] = Product(**data)
+
+    if products:
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                list(products.values()),
+                update_conflicts=True,
+                unique_fields=['code'],
+                update_fields=list(UPSERT_FIELDS),
+            )
+            # bulk_create does not send post_save.
+            sync_cards(Product.objects.filter(code__in=list(products)))
+            product_cache.invalidate_on_commit()
+        report.imported += len(products)
+
+
+def import_products(rows, batch_size=1000):
+    """
+    Validate and upsert products on `code`, one transaction per batch.
+    A bad row is recorded in the report and never aborts the batch.
+    """
+    report = ImportReport()
+    start = time.perf_counter()
+    batch = []
+    for line_number, row in rows:
+        report.rows += 1
+        if row is None:
+            report.rejected.append({'line': line_number, 'errors': {'non_field_errors': ['JSON inválido']}})
+            continue
+        batch.append((line_number, row))
+        if len(batch) >= batch_size:
+            _flush(batch, report)
+            batch = []
+    if batch:
+        _flush(batch, report)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def export_rows(queryset, fmt, chunk_size=2000):
+    """
+    Yield encoded chunks for a streaming response. Rows come from a
+    server-side cursor, so memory stays flat regardless of catalog size.
+    """
+    rows = queryset.order_by('id').values_list(*PRODUCT_COLUMNS).iterator(chunk_size=chunk_size)
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(PRODUCT_COLUMNS)
+        write = writer.writerow
+    elif fmt == 'ndjson':
+        def write(row):
+            record = dict(zip(PRODUCT_COLUMNS, row))
+            record['price'] = str(record['price'])
+            buffer.write(json.dumps(record, ensure_ascii=False))
+            buffer.write('\n')
+    else:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
@@ -0,0 +1,246 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCAL_MAX_ENTRIES': 1024,
+    'VERSION_TTL': 1.0,
+    'LOCK_TIMEOUT': 5.0,
+    # Longest an invalidate_soon() change waits for its version bump.
+    'COALESCE_SECONDS': 5.0,
+}
+
+
+class LocalLRU:
+    """Small thread-safe LRU dict used as the in-process tier."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResponseCache:
+    """
+    Two-tier, versioned cache of rendered response bodies.
+
+    Entries are stored as bytes under keys that embed a namespace version.
+    Invalidation bumps the version in the shared backend, which orphans every
+    entry at once; orphans simply age out. Processes re-read the version at
+    most every VERSION_TTL seconds, so other workers see a write within that
+    window, and the writing process sees it immediately.
+
+    High-rate changes that may show a few seconds late (stock levels) use
+    `invalidate_soon()` instead: every write in a COALESCE_SECONDS window
+    shares one bump, applied by the first process to re-read the version
+    once it is due.
+    """
+
+    def __init__(self, namespace, options=None):
+        self.namespace = namespace
+        self.options = dict(DEFAULTS, **(options or {}))
+        self.local = LocalLRU(self.options['LOCAL_MAX_ENTRIES'])
+        self._version = None
+        self._version_read_at = 0.0
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.options['ALIAS']]
+
+    @property
+    def version_key(self):
+        return f"{self.namespace}:version"
+
+    @property
+    def invalidated_key(self):
+        return f"{self.namespace}:invalidated"
+
+    @property
+    def pending_key(self):
+        return f"{self.namespace}:pending"
+
+    def get_version(self):
+        now = time.monotonic()
+        if self._version is None or now - self._version_read_at > self.options['VERSION_TTL']:
+            values = self.backend.get_many([self.version_key, self.pending_key])
+            due = values.get(self.pending_key)
+            if due is not None and due <= time.time():
+                self.invalidate()
+                return self._version
+            version = values.get(self.version_key)
+            if version is None:
+                self.backend.add(self.version_key, 1, None)
+                version = self.backend.get(self.version_key, 1)
+            self._version = version
+            self._version_read_at = now
+        return self._version
+
+    def make_key(self, *parts):
+        digest = hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+        return f"{self.namespace}:v{self.get_version()}:{digest}"
+
+    def invalidate(self):
+        # Covers any pending bump. Dropped first, so a write committing
+        # meanwhile schedules a new one rather than being folded into this.
+        self.backend.delete(self.pending_key)
+        try:
+            version = self.backend.incr(self.version_key)
+        except ValueError:
+            self.backend.add(self.version_key, 1, None)
+            version = self.backend.incr(self.version_key)
+        self._version = version
+        self._version_read_at = time.monotonic()
+        self.backend.set(self.invalidated_key, time.time(), None)
+        self.local.clear()
+
+    def invalidated_within(self, seconds):
+        """Whether any process invalidated the namespace in the last `seconds`."""
+        stamp = self.backend.get(self.invalidated_key)
+        return stamp is not None and time.time() - stamp < seconds
+
+    def invalidate_on_commit(self):
+        """
+        Invalidate now and again once the surrounding transaction commits,
+        so a reader cannot re-cache pre-commit data under the new version.
+        """
+        self.invalidate()
+        transaction.on_commit(self.invalidate)
+
+    def invalidate_soon(self):
+        """
+        Invalidate within COALESCE_SECONDS of the surrounding transaction
+        committing. Writes already waiting for a bump share it.
+        """
+        transaction.on_commit(lambda: self.backend.add(
+            self.pending_key, time.time() + self.options['COALESCE_SECONDS'], None,
+        ))
+
+    def clear(self):
+        self.local.clear()
+        self.backend.delete_many([self.version_key, self.invalidated_key, self.pending_key])
+        self._version = None
+
+    def _key_lock(self, key):
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                if len(self._locks) > self.options['LOCAL_MAX_ENTRIES']:
+                    self._locks = {k: v for k, v in self._locks.items() if v.locked()}
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _lookup(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.backend.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def get_or_set(self, key, producer):
+        """
+        Return the cached bytes for `key`, calling `producer` on a miss.
+
+        Only one thread per process and, through an `add()` lock in the
+        shared backend, one process per key runs the producer; the others
+        wait for its result for up to LOCK_TIMEOUT seconds. A producer
+        returning None means "do not cache" and is passed straight through.
+        """
+        value = self._lookup(key)
+        if value is not None:
+            return value
+
+        with self._key_lock(key):
+            value = self._lookup(key)
+            if value is not None:
+                return value
+
+            lock_key = f"{key}:lock"
+            lock_timeout = self.options['LOCK_TIMEOUT']
+            if not self.backend.add(lock_key, 1, lock_timeout):
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = self._lookup(key)
+                    if value is not None:
+                        return value
+            try:
+                value = producer()
+                if value is not None:
+                    self.backend.set(key, value, self.options['TIMEOUT'])
+                    self.local.set(key, value)
+                return value
+            finally:
+                self.backend.delete(lock_key)
+
+
+product_cache = ResponseCache('products', getattr(settings, 'PRODUCT_CACHE', None))
+
+
+class CachedReadMixin:
+    """
+    ViewSet mixin serving `list`/`retrieve` from a ResponseCache.
+
+    Only successful responses rendered with a JSON-type renderer are cached;
+    the browsable API and errors always go through the normal path. The key
+    is the absolute URI, since pagination links and image URLs embed it.
+    """
+    response_cache = product_cache
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, 'list', super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, 'retrieve', super().retrieve, *args, **kwargs)
+
+    def cached_response(self, request, kind, handler, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+
+        uncached = []
+
+        def render():
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                uncached.append(response)
+                return None
+            return renderer.render(response.data, request.accepted_media_type, self.get_renderer_context())
+
+        key = self.response_cache.make_key(kind, request.build_absolute_uri())
+        body = self.response_cache.get_or_set(key, render)
+        if body is None:
+            return uncached[0]
+        return HttpResponse(body, content_type=renderer.media_type)
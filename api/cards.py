@@ -0,0 +1,110 @@
+"""
+Catalog cards: the `ProductCard` read model behind `?view=card`.
+
+A card holds what the catalog grid shows (name, price, brand, main image
+URL and an in-stock flag), so the card list is one index scan over one
+table instead of products plus an image prefetch and per-row URL building.
+Cards are written in the same transaction as the change they reflect:
+
+- product saves and bulk imports upsert whole cards (`sync_cards`);
+- image changes rewrite the image URL (`sync_card_images`);
+- stock reservations, which UPDATE products, refresh the in-stock flag
+  (`sync_card_stock`).
+
+Deleting a product deletes its card. `rebuild_product_cards` recomputes
+every card, e.g. after bulk_create/update() calls that bypass all of this.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from .models import Product, ProductCard, ProductImage
+
+BATCH_SIZE = 1000
+CARD_FIELDS = ('name', 'brand', 'price', 'in_stock', 'image', 'created_at', 'updated_at')
+
+
+def image_url(image):
+    """
+    The URL ProductImageSerializer.get_image builds, without the scheme and
+    host it adds for local media (those depend on the request).
+    """
+    name = image.name
+    if not name:
+        return ''
+    if "http://" in name or "https://" in name:
+        return name[name.find("http"):]
+    if name.startswith('data:'):
+        return name
+    try:
+        return image.url
+    except ValueError:
+        return ''
+
+
+def main_image_urls(product_ids, using='default'):
+    """`{product_id: url}`; the `is_main` image, else the oldest one."""
+    files = {}
+    images = (ProductImage.objects.using(using).filter(product_id__in=product_ids)
+              .order_by('product_id', '-is_main', 'id').only('product_id', 'image'))
+    for image in images:
+        files.setdefault(image.product_id, image.image)
+    return {product_id: image_url(file) for product_id, file in files.items()}
+
+
+def sync_cards(products, using='default'):
+    """Upsert the cards of saved `products` (an iterable of Product)."""
+    batch = []
+    for product in products:
+        batch.append(product)
+        if len(batch) >= BATCH_SIZE:
+            _upsert(batch, using)
+            batch = []
+    if batch:
+        _upsert(batch, using)
+
+
+def _upsert(products, using):
+    urls = main_image_urls([product.pk for product in products], using)
+    ProductCard.objects.using(using).bulk_create(
+        [
+            ProductCard(
+                product_id=product.pk, name=product.name, brand=product.brand, price=product.price,
+                in_stock=product.quantity > 0, image=urls.get(product.pk, ''),
+                created_at=product.created_at, updated_at=product.updated_at,
+            )
+            for product in products
+        ],
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=list(CARD_FIELDS),
+    )
+
+
+def _product(using):
+    return Product.objects.using(using).filter(pk=OuterRef('product_id'))
+
+
+def sync_card_images(product_ids, using='default'):
+    urls = main_image_urls(product_ids, using)
+    for product_id in product_ids:
+        # UPDATE only: during a product delete the card may already be gone.
+        ProductCard.objects.using(using).filter(product_id=product_id).update(
+            image=urls.get(product_id, ''),
+            updated_at=Subquery(_product(using).values('updated_at')[:1]),
+        )
+
+
+def sync_card_stock(product_ids, using='default'):
+    """Refresh the in-stock flag of several cards in one UPDATE."""
+    ProductCard.objects.using(using).filter(product_id__in=list(product_ids)).update(
+        in_stock=Exists(_product(using).filter(quantity__gt=0)),
+        updated_at=Subquery(_product(using).values('updated_at')[:1]),
+    )
+
+
+def rebuild(using='default'):
+    """Recompute every card in one transaction. Returns the number of cards."""
+    with transaction.atomic(using=using):
+        ProductCard.objects.using(using).delete()
+        sync_cards(Product.objects.using(using).order_by('id').iterator(chunk_size=BATCH_SIZE), using)
+    return ProductCard.objects.using(using).count()
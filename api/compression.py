@@ -0,0 +1,188 @@
+"""
+Negotiated response compression: zstd, brotli and gzip.
+
+`CompressionMiddleware` is Django's GZipMiddleware generalised to several
+encodings. It picks the best encoding the client accepts (by q-value, then
+by the configured preference), skips small bodies and content types that
+do not compress, and compresses streaming responses chunk by chunk, so
+they are still delivered incrementally.
+
+gzip is always available; brotli and zstd are used when the `brotli` and
+`zstandard` packages are installed.
+"""
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+DEFAULTS = {
+    # Non-streaming bodies shorter than this are sent as they are.
+    'MIN_SIZE': 1024,
+    # Preference between encodings the client accepts equally.
+    'ENCODINGS': ('zstd', 'br', 'gzip'),
+    'LEVELS': {'zstd': 3, 'br': 4, 'gzip': 6},
+    'CONTENT_TYPES': ('application/json', 'application/x-ndjson', 'text/'),
+}
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'RESPONSE_COMPRESSION', {}))
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+COMPRESSORS = {'gzip': GzipCompressor}
+if brotli is not None:
+    COMPRESSORS['br'] = BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS['zstd'] = ZstdCompressor
+
+
+def parse_accept_encoding(header):
+    """`{coding: q}` from an Accept-Encoding header."""
+    codings = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def choose_encoding(header, preference):
+    """Best available encoding in `preference` accepted by `header`, or None."""
+    codings = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for encoding in preference:
+        if encoding not in COMPRESSORS:
+            continue
+        q = codings.get(encoding, codings.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_chunks(chunks, compressor):
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_chunks(chunks, compressor):
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with the best encoding the client accepts.
+
+    Place it right after RequestMetricsMiddleware, before anything that
+    changes the response body.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.options = get_options()
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < self.options['MIN_SIZE']:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(tuple(self.options['CONTENT_TYPES'])):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.options['ENCODINGS'])
+        if encoding is None:
+            return response
+        compressor = COMPRESSORS[encoding](self.options['LEVELS'][encoding])
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_chunks(response.streaming_content, compressor)
+            else:
+                response.streaming_content = compress_chunks(response.streaming_content, compressor)
+            # The compressed size is only known once the stream has been sent.
+            del response.headers['Content-Length']
+        else:
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # Byte-for-byte identity no longer holds, so a strong ETag becomes
+        # weak (RFC 9110 8.8.1); If-None-Match still matches it.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
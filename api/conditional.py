@@ -0,0 +1,54 @@
+import hashlib
+import json
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_validators(request, *parts, last_modified=None):
+    """
+    `(etag, last_modified)` for a representation identified by the request
+    URI and format plus `parts` describing the data (e.g. a max timestamp
+    and a row count). `last_modified` is a datetime or None.
+    """
+    seed = '|'.join(str(part) for part in (
+        request.build_absolute_uri(), request.accepted_renderer.format, *parts,
+    ))
+    etag = quote_etag(hashlib.sha1(seed.encode('utf-8')).hexdigest())
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+    return etag, timestamp
+
+
+def dump_validators(validators):
+    return json.dumps(validators).encode('utf-8')
+
+
+def load_validators(data):
+    return tuple(json.loads(data))
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin answering If-None-Match / If-Modified-Since with 304 before
+    the response body is built, and sending ETag / Last-Modified otherwise.
+    """
+
+    def conditional_response(self, request, validators, respond):
+        """
+        `validators` is `(etag, last_modified_timestamp)` or None when the
+        resource has none (e.g. it does not exist); `respond()` builds the
+        full response and only runs when the client copy is stale.
+        """
+        if validators is None:
+            return respond()
+        etag, last_modified = validators
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+        response = respond()
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
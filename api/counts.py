@@ -0,0 +1,110 @@
+"""
+Row counts that stay cheap on large tables.
+
+`COUNT(*)` of a whole table reads every row, which on a million-row table
+costs as much as the page it is shown next to, many times over.
+`count_rows` estimates only such unfiltered counts, and only once the table
+is known to hold at least EXACT_BELOW rows, flagging the figure as such:
+
+- On PostgreSQL the table is sized from `pg_class.reltuples`.
+- Elsewhere it is counted once and the figure is cached. Signals keep it
+  current (see `adjust_cached_count`), and it expires after CACHE_TIMEOUT
+  so drift from bulk writes is bounded.
+
+Filtered querysets (a user's cart, a search) are always counted exactly:
+planner estimates for them can be off by orders of magnitude.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+DEFAULTS = {
+    # Estimates below this are replaced with an exact COUNT(*).
+    'EXACT_BELOW': 10_000,
+    'CACHE_ALIAS': 'default',
+    'CACHE_TIMEOUT': 60,
+}
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'ROW_COUNTS', {}))
+
+
+def is_unfiltered(queryset):
+    """Whether `queryset` has one row per row of its table."""
+    query = queryset.query
+    return not (query.where or query.distinct or query.is_sliced or query.combinator)
+
+
+def table_estimate(model, using):
+    """`pg_class.reltuples` for `model`'s table, or None before it is analyzed."""
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)',
+                       [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 (or 0 before PostgreSQL 14) until the first ANALYZE.
+    if row is None or row[0] <= 0:
+        return None
+    return row[0]
+
+
+def count_key(model, using):
+    return f"counts:{using}:{model._meta.label_lower}"
+
+
+def cached_table_count(queryset, exact_below, options):
+    """
+    `(count, estimated)` for a whole table: the cached figure if there is
+    one, else an exact count, cached when it reaches `exact_below`.
+    """
+    cache = caches[options['CACHE_ALIAS']]
+    key = count_key(queryset.model, queryset.db)
+    count = cache.get(key)
+    if count is not None:
+        return count, True
+    count = queryset.count()
+    if count >= exact_below:
+        cache.add(key, count, options['CACHE_TIMEOUT'])
+    return count, False
+
+
+def adjust_cached_count(model, using, delta):
+    """Apply a row insert/delete to `model`'s cached count, if it has one."""
+    try:
+        caches[get_options()['CACHE_ALIAS']].incr(count_key(model, using), delta)
+    except ValueError:
+        pass
+
+
+def count_rows(queryset, exact_below=None):
+    """
+    `(count, estimated)` for `queryset`: exact when it is filtered or its
+    table holds fewer than `exact_below` (EXACT_BELOW by default) rows, an
+    estimate otherwise.
+    """
+    options = get_options()
+    if exact_below is None:
+        exact_below = options['EXACT_BELOW']
+    if not is_unfiltered(queryset):
+        return queryset.count(), False
+    if connections[queryset.db].vendor != 'postgresql':
+        return cached_table_count(queryset, exact_below, options)
+
+    estimate = table_estimate(queryset.model, queryset.db)
+    if estimate is None or estimate < exact_below:
+        return queryset.count(), False
+    return estimate, True
+
+
+def estimated_count(queryset, exact_below=None):
+    return count_rows(queryset, exact_below)[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose `count` comes from `estimated_count`."""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfiguredPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count taken from PASSWORD_HASH_ITERATIONS.
+
+    It keeps the stock `pbkdf2_sha256` algorithm name, so existing hashes
+    verify unchanged; `must_update` compares their stored iteration count
+    with the setting, and `check_password` then re-hashes the password on
+    the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
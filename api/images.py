@@ -0,0 +1,153 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import ProductImage
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WORKERS': 2,
+    'WIDTHS': (160, 480, 960),
+    'QUALITY': 80,
+    # Run jobs inline in the calling thread (tests, management commands).
+    'ALWAYS_EAGER': False,
+}
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'IMAGE_PROCESSING', {}))
+
+
+def is_remote(name):
+    return "http://" in name or "https://" in name or name.startswith('data:')
+
+
+def _encode(image, fmt, quality):
+    buffer = io.BytesIO()
+    # Saving without an `exif=` argument drops the EXIF block.
+    image.save(buffer, format=fmt, quality=quality)
+    return buffer.getvalue()
+
+
+def process_image(image_id):
+    """
+    Generate resized WebP variants for one ProductImage, strip EXIF from the
+    original and record dimensions and variant names on the row.
+    """
+    try:
+        record = ProductImage.objects.get(pk=image_id)
+    except ProductImage.DoesNotExist:
+        return
+    name = record.image.name
+    if not name or is_remote(name):
+        return
+
+    options = get_options()
+    storage = record.image.storage
+    stripped = None
+    try:
+        with storage.open(name, 'rb') as handle:
+            source = Image.open(handle)
+            source.load()
+        original_format = source.format or 'JPEG'
+        had_exif = bool(source.info.get('exif'))
+        # Bake the EXIF orientation into the pixels before it is discarded.
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        # The stripped copy is written next to the original and only swapped
+        # in below, so the original is never missing and survives failures.
+        if had_exif:
+            stripped = storage.save(name, ContentFile(_encode(
+                image.convert('RGB') if original_format == 'JPEG' else image,
+                original_format, 90,
+            )))
+
+        stem = os.path.splitext(os.path.basename(name))[0]
+        variants = {}
+        for width in sorted(options['WIDTHS']):
+            if width >= image.width:
+                break
+            resized = image.copy()
+            resized.thumbnail((width, image.height * width // image.width + 1), Image.LANCZOS)
+            variant_name = storage.save(
+                f"products/variants/{stem}_{width}w.webp",
+                ContentFile(_encode(resized, 'WEBP', options['QUALITY'])),
+            )
+            variants[str(width)] = variant_name
+        variants[str(image.width)] = storage.save(
+            f"products/variants/{stem}_{image.width}w.webp",
+            ContentFile(_encode(image, 'WEBP', options['QUALITY'])),
+        )
+    except Exception:
+        logger.exception("Could not process ProductImage %s", image_id)
+        if stripped:
+            storage.delete(stripped)
+        ProductImage.objects.filter(pk=image_id).update(status='FAILED')
+        return
+
+    record.width, record.height = image.width, image.height
+    record.variants = variants
+    record.status = 'READY'
+    if stripped:
+        record.image.name = stripped
+    # save() rather than update() so post_save invalidates the product cache.
+    record.save(update_fields=['image', 'width', 'height', 'variants', 'status'])
+    if stripped:
+        storage.delete(name)
+
+
+class ImageProcessor:
+    """
+    Thread pool that processes uploads off the request path.
+
+    The executor's work queue is the local stand-in for a broker; jobs are
+    only submitted after the upload's transaction commits, so workers never
+    see a row that may still roll back.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def _run(self, image_id):
+        close_old_connections()
+        try:
+            process_image(image_id)
+        finally:
+            close_old_connections()
+
+    def submit(self, image_id):
+        options = get_options()
+        if options['ALWAYS_EAGER']:
+            process_image(image_id)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=options['WORKERS'], thread_name_prefix='product-images',
+                )
+            future = self._executor.submit(self._run, image_id)
+            self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+
+    def enqueue(self, image_id):
+        transaction.on_commit(lambda: self.submit(image_id))
+
+    def wait(self, timeout=None):
+        """Block until every submitted job has finished."""
+        for future in list(self._futures):
+            future.result(timeout)
+
+
+processor = ImageProcessor()
@@ -0,0 +1,233 @@
+import itertools
+import json
+import os
+import platform
+from unittest import mock
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from api.authentication import UserRefreshToken
+from api.benchmarks import compare, isolated_database, measure, route_names
+from api.models import Cart, CartItem, Order, Product, User
+from api.ratelimit import LoginRateLimiter
+from api.synthetic import generate_dataset
+from api.urls import urlpatterns
+
+PASSWORD = 'bench'
+
+# Recorded with the default options on SQLite: `manage.py bench_api --save`.
+# Re-record it when a change is meant to move the numbers.
+BASELINE = os.path.join(os.path.dirname(__file__), 'bench_api_baseline.json')
+
+# One scenario per named route in api/urls.py: who calls it, how, and an
+# optional untimed `setup(ids)` run before every call. Paths, bodies and
+# setups are formatted with / called on the fixture ids built in `seed`.
+SCENARIOS = {
+    'api-root': {'as': 'customer', 'path': '/api/'},
+    'product-list': {'as': 'customer', 'path': '/api/products/'},
+    'product-detail': {'as': 'customer', 'path': '/api/products/{product}/'},
+    'product-search': {'as': 'customer', 'path': '/api/products/search/?q=teléfono'},
+    'product-export': {'as': 'admin', 'path': '/api/products/export/?output=ndjson'},
+    'order-list': {'as': 'admin', 'path': '/api/orders/'},
+    'order-detail': {'as': 'admin', 'path': '/api/orders/{order}/'},
+    'user-list': {'as': 'admin', 'path': '/api/users/'},
+    'user-detail': {'as': 'customer', 'path': '/api/users/{customer}/'},
+    'user-assign-role': {
+        'as': 'admin', 'method': 'post', 'path': '/api/users/{target}/assign_role/',
+        'data': lambda ids: {'role': 'CUSTOMER'},
+    },
+    'user-revoke-tokens': {'as': 'admin', 'method': 'post', 'path': '/api/users/{target}/revoke_tokens/'},
+    'cart-list': {'as': 'customer', 'path': '/api/carts/'},
+    'cart-detail': {'as': 'customer', 'path': '/api/carts/{cart}/'},
+    'cart-batch': {
+        'as': 'customer', 'method': 'post', 'path': '/api/carts/batch/',
+        'data': lambda ids: {'operations': [{'op': 'set', 'product': pk, 'quantity': 1} for pk in ids['stocked']]},
+    },
+    'cart-checkout': {
+        'as': 'buyer', 'method': 'post', 'path': '/api/carts/checkout/',
+        'setup': lambda ids: fill_cart(ids['buyer_cart'], ids['stocked']),
+    },
+    'cartitem-list': {'as': 'customer', 'path': '/api/cartitems/'},
+    'cartitem-detail': {'as': 'customer', 'path': '/api/cartitems/{cartitem}/'},
+    'login': {
+        'as': None, 'method': 'post', 'path': '/api/login/',
+        'data': lambda ids: {'email': ids['customer_email'], 'password': PASSWORD},
+    },
+    'signup': {
+        'as': None, 'method': 'post', 'path': '/api/signup/',
+        'data': lambda ids: signup_body(next(ids['signups'])),
+    },
+    'token_refresh': {
+        'as': None, 'method': 'post', 'path': '/api/token/refresh/',
+        'data': lambda ids: {'refresh': ids['refresh']},
+    },
+    'dashboard': {'as': 'admin', 'path': '/api/dashboard/'},
+    'metrics': {'as': 'admin', 'path': '/api/metrics/'},
+    'async-product-list': {'as': 'customer', 'path': '/api/async/products/'},
+    'async-product-detail': {'as': 'customer', 'path': '/api/async/products/{product}/'},
+    'async-cart': {'as': 'customer', 'path': '/api/async/cart/'},
+}
+
+
+def fill_cart(cart_id, product_ids):
+    CartItem.objects.filter(cart_id=cart_id).delete()
+    CartItem.objects.bulk_create(
+        CartItem(cart_id=cart_id, product_id=product_id, quantity=1, current_price=1)
+        for product_id in product_ids
+    )
+
+
+def signup_body(number):
+    return {
+        'username': f'bench-signup-{number}', 'email': f'signup{number}@example.com',
+        'password': 'Bench-signup-1', 'first_name': 'Bench', 'last_name': 'Signup',
+    }
+
+
+def call_for(client, scenario, ids):
+    method = getattr(client, scenario.get('method', 'get'))
+    path = scenario['path'].format(**ids)
+    data = scenario.get('data')
+
+    def call():
+        if data is None:
+            response = method(path)
+        else:
+            response = method(path, data(ids), content_type='application/json')
+        if response.streaming:
+            # Streaming bodies are produced while being read.
+            for _ in response.streaming_content:
+                pass
+        return response
+    return call
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every route in api/urls.py against seeded fixtures: "
+        "throughput, latency percentiles, queries and peak memory. Results "
+        "can be saved as a JSON baseline and compared against one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10_000)
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--carts', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=20_000)
+        parser.add_argument('--images', type=int, default=2, help="Images per product.")
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--routes', help="Comma-separated route names to run (default: all).")
+        parser.add_argument('--save', metavar='PATH', nargs='?', const=BASELINE,
+                            help="Write the results as a JSON baseline (default: the committed one).")
+        parser.add_argument('--compare', metavar='PATH', nargs='?', const=BASELINE,
+                            help="Fail on regressions against a baseline (default: the committed one).")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed relative growth of p50 latency and peak memory.")
+
+    def handle(self, *args, **options):
+        missing = route_names(urlpatterns) - set(SCENARIOS)
+        if missing:
+            raise CommandError(f"Routes without a benchmark scenario: {', '.join(sorted(missing))}")
+        names = options['routes'].split(',') if options['routes'] else sorted(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}")
+
+        baseline = None
+        if options['compare']:
+            if not os.path.exists(options['compare']):
+                raise CommandError(
+                    f"No baseline at {options['compare']}. Record one first with "
+                    f"`python manage.py bench_api --save {options['compare']}` and the same fixture options."
+                )
+            with open(options['compare']) as handle:
+                baseline = json.load(handle)
+
+        fixture = {key: options[key] for key in ('products', 'users', 'carts', 'orders', 'images', 'seed')}
+        with isolated_database():
+            self.stdout.write(f"Seeding {fixture} on {connection.vendor}...")
+            ids, clients = self.seed(fixture)
+            # Login attempts would otherwise hit the per-account limit.
+            unlimited = LoginRateLimiter({'BACKEND': 'local', 'IP': (10 ** 9, 0), 'ACCOUNT': (10 ** 9, 0)})
+            results = {}
+            with mock.patch('api.views.login_limiter', unlimited):
+                for name in names:
+                    scenario = SCENARIOS[name]
+                    call = call_for(clients[scenario['as']], scenario, ids)
+                    setup = scenario.get('setup')
+                    # Warm caches, the search index and the auth state first.
+                    if setup:
+                        setup(ids)
+                    call()
+                    results[name] = measure(call, options['repeat'], setup and (lambda: setup(ids)))
+                    self.report(name, results[name])
+
+        report = {
+            'meta': dict(
+                fixture, repeat=options['repeat'], vendor=connection.vendor,
+                python=platform.python_version(), django=django.get_version(),
+            ),
+            'routes': results,
+        }
+        if options['save']:
+            with open(options['save'], 'w') as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+            self.stdout.write(f"Baseline written to {options['save']}")
+
+        if baseline is not None:
+            changed = {
+                key for key in ('products', 'users', 'carts', 'orders', 'images', 'seed', 'vendor')
+                if baseline['meta'].get(key) != report['meta'][key]
+            }
+            if changed:
+                self.stderr.write(f"Baseline was recorded with different {', '.join(sorted(changed))}.")
+            previous = {name: route for name, route in baseline['routes'].items() if name in results}
+            problems = compare(previous, results, options['tolerance'])
+            if problems:
+                raise CommandError("Performance regressions:\n  " + "\n  ".join(problems))
+            self.stdout.write(f"No regressions against {options['compare']}.")
+
+    def seed(self, fixture):
+        people = generate_dataset(
+            fixture['products'], users=fixture['users'] + 1, carts=fixture['carts'],
+            orders=fixture['orders'], images_per_product=fixture['images'],
+            password=PASSWORD, seed=fixture['seed'],
+        )
+        customer, target = people[0], people[-1]
+        admin = User.objects.create_user(
+            username='bench-admin', email='admin@example.com', password=PASSWORD, role='ADMIN',
+        )
+        buyer = User.objects.create_user(username='bench-buyer', email='buyer@example.com', password=PASSWORD)
+        cart = Cart.objects.get_or_create(user=customer)[0]
+        stocked = list(Product.objects.order_by('id').values_list('id', flat=True)[:3])
+        Product.objects.filter(pk__in=stocked).update(quantity=10 ** 9)
+
+        ids = {
+            'product': stocked[0],
+            'order': Order.objects.order_by('id').values_list('id', flat=True).first(),
+            'customer': customer.pk,
+            'customer_email': customer.email,
+            'target': target.pk,
+            'cart': cart.pk,
+            'cartitem': cart.cartitem_set.order_by('id').values_list('id', flat=True).first(),
+            'buyer_cart': Cart.objects.create(user=buyer).pk,
+            'stocked': stocked,
+            'refresh': str(UserRefreshToken.for_user(customer)),
+            'signups': itertools.count(),
+        }
+        clients = {None: Client()}
+        for role, user in (('customer', customer), ('admin', admin), ('buyer', buyer)):
+            token = UserRefreshToken.for_user(user).access_token
+            clients[role] = Client(headers={'Authorization': f'Bearer {token}'})
+        return ids, clients
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<22} {result['status']:>4} {result['queries']:>3}q "
+            f"{result['rps']:>8.1f} rps  p50 {result['p50_ms']:>7.2f}  p95 {result['p95_ms']:>7.2f}  "
+            f"p99 {result['p99_ms']:>7.2f} ms  peak {result['peak_kib']:>8.1f} KiB"
+        )
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.authentication import UserRefreshToken
+from api.benchmarks import isolated_database, summarize, timed
+from api.models import Cart, CartItem, Product, User
+from api.synthetic import generate_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Queries and latency per authenticated /api/ request with database-backed "
+        "tokens (no claims) versus claim-carrying tokens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            generate_products(50)
+            product = Product.objects.order_by('id').first()
+            users = {
+                role: User.objects.create_user(
+                    username=f'bench-{role.lower()}', email=f'{role.lower()}@example.com',
+                    password='bench', role=role,
+                )
+                for role in ('ADMIN', 'CUSTOMER')
+            }
+            cart = Cart.objects.create(user=users['CUSTOMER'])
+            CartItem.objects.create(cart=cart, product=product, quantity=1, current_price=product.price)
+
+            paths = [
+                '/api/products/',
+                f'/api/products/{product.pk}/',
+                '/api/products/search/?q=producto',
+                '/api/carts/',
+                '/api/cartitems/',
+                '/api/users/',
+                f"/api/users/{users['CUSTOMER'].pk}/",
+                '/api/dashboard/',
+                '/api/async/cart/',
+            ]
+            self.stdout.write(
+                f"{'role':<9} {'path':<36} {'db q':>5} {'claims q':>9} {'db p50':>9} {'claims p50':>11}"
+            )
+            for role, user in users.items():
+                clients = {
+                    kind: Client(headers={'Authorization': f'Bearer {token_class.for_user(user).access_token}'})
+                    for kind, token_class in (('db', RefreshToken), ('claims', UserRefreshToken))
+                }
+                for path in paths:
+                    row = {}
+                    for kind, client in clients.items():
+                        # Warm the response and auth-state caches first.
+                        client.get(path)
+                        times = []
+                        for _ in range(options['repeat']):
+                            with CaptureQueriesContext(connection) as queries:
+                                elapsed, response = timed(client.get, path)
+                            times.append(elapsed)
+                        row[kind] = (len(queries), summarize(times)['p50_ms'], response.status_code)
+                    self.stdout.write(
+                        f"{role:<9} {path:<36} {row['db'][0]:>5} {row['claims'][0]:>9} "
+                        f"{row['db'][1]:>7.2f}ms {row['claims'][1]:>9.2f}ms"
+                        + ("" if row['db'][2] == row['claims'][2] else "  (status differs)")
+                    )
@@ -0,0 +1,58 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from api.benchmarks import isolated_database, summarize, timed
+from api.models import Cart, CartItem, Product, User
+from api.synthetic import generate_products
+
+
+class Command(BaseCommand):
+    help = "Compare per-item POST /api/orders/ with POST /api/carts/checkout/."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,20,50',
+                            help="Comma-separated cart sizes to measure.")
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with isolated_database():
+            generate_products(max(sizes))
+            Product.objects.update(quantity=10 ** 6)
+            products = list(Product.objects.order_by('id'))
+            user = User.objects.create_user(username='bench', email='bench@example.com', password='bench')
+            client = APIClient()
+            client.force_authenticate(user)
+
+            self.stdout.write(f"{'items':>6} {'loop q':>8} {'loop p50':>10} {'checkout q':>11} {'checkout p50':>13}")
+            for size in sizes:
+                loop_times, checkout_times = [], []
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as loop_queries:
+                        elapsed, _ = timed(self.order_each, client, products[:size])
+                    loop_times.append(elapsed)
+
+                    self.fill_cart(user, products[:size])
+                    with CaptureQueriesContext(connection) as checkout_queries:
+                        elapsed, response = timed(client.post, '/api/carts/checkout/')
+                    assert response.status_code == 201, response.content
+                    checkout_times.append(elapsed)
+
+                self.stdout.write(
+                    f"{size:>6} {len(loop_queries):>8} {summarize(loop_times)['p50_ms']:>8.1f}ms "
+                    f"{len(checkout_queries):>11} {summarize(checkout_times)['p50_ms']:>11.1f}ms"
+                )
+
+    def order_each(self, client, products):
+        for product in products:
+            response = client.post('/api/orders/', {'product': product.pk, 'quantity': 1})
+            assert response.status_code == 201, response.content
+
+    def fill_cart(self, user, products):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=1, current_price=product.price)
+            for product in products
+        ])
@@ -0,0 +1,68 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from api.benchmarks import isolated_database
+from api.models import User
+from api.ratelimit import LoginRateLimiter
+
+
+def cpu_per_call(func, count):
+    """CPU seconds per call of `func(i)`, measured on this process only."""
+    start = time.process_time()
+    for i in range(count):
+        func(i)
+    return (time.process_time() - start) / count
+
+
+class Command(BaseCommand):
+    help = (
+        "CPU cost of /api/login/: logins/sec per core for the old two-lookup "
+        "path versus the email backend, and for credential-stuffing traffic "
+        "with and without the rate limiter."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=50)
+        parser.add_argument('--accounts', type=int, default=20)
+
+    def handle(self, *args, **options):
+        attempts = options['attempts']
+        with isolated_database():
+            users = [
+                User.objects.create_user(
+                    username=f'bench-login-{i}', email=f'login{i}@example.com', password='bench-password',
+                )
+                for i in range(options['accounts'])
+            ]
+            emails = [user.email for user in users]
+            client = Client(REMOTE_ADDR='203.0.113.7')
+
+            def legacy(i):
+                user = User.objects.get(email=emails[i % len(emails)])
+                authenticate(username=user.username, password='bench-password')
+
+            def email_backend(i):
+                authenticate(email=emails[i % len(emails)], password='bench-password')
+
+            def stuffing(i):
+                client.post('/api/login/', {'email': emails[i % len(emails)], 'password': f'guess-{i}'})
+
+            rows = [
+                ('valid, get + authenticate', cpu_per_call(legacy, attempts)),
+                ('valid, EmailBackend', cpu_per_call(email_backend, attempts)),
+            ]
+            unlimited = LoginRateLimiter({'BACKEND': 'local', 'IP': (10 ** 9, 0), 'ACCOUNT': (10 ** 9, 0)})
+            with mock.patch('api.views.login_limiter', unlimited):
+                rows.append(('stuffing, no limiter', cpu_per_call(stuffing, attempts)))
+            # The default per-IP and per-account limits.
+            with mock.patch('api.views.login_limiter', LoginRateLimiter({'BACKEND': 'local'})):
+                rows.append(('stuffing, limiter', cpu_per_call(stuffing, attempts)))
+
+        self.stdout.write(f"{'scenario':<28} {'cpu/attempt':>12} {'attempts/s/core':>16}")
+        for label, cpu in rows:
+            rate = 1 / cpu if cpu else float('inf')
+            self.stdout.write(f"{label:<28} {cpu * 1000:>10.2f}ms {rate:>16.1f}")
@@ -0,0 +1,46 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import isolated_database, summarize, timed
+from api.search import search_products
+from api.synthetic import BRANDS, CATEGORIES, WORDS, generate_products
+
+
+class Command(BaseCommand):
+    help = "Benchmark /api/products/search/ latency against a synthetic catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Reuse the benchmark database between runs.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with isolated_database(keepdb=options['keepdb']) as connection:
+            self.stdout.write(f"Generating {options['products']} products on {connection.vendor}...")
+            elapsed, _ = timed(generate_products, options['products'], seed=options['seed'])
+            self.stdout.write(f"Fixture ready in {elapsed:.1f}s")
+
+            # Warm up caches (and the inverted index on non-PostgreSQL backends).
+            search_products(WORDS[0], {}, options['limit'])
+
+            samples = []
+            for _ in range(options['queries']):
+                query = ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+                params = {}
+                if rng.random() < 0.3:
+                    params['brand'] = rng.choice(BRANDS)
+                if rng.random() < 0.3:
+                    params['category'] = rng.choice(CATEGORIES)
+                duration, _ = timed(search_products, query, params, options['limit'])
+                samples.append(duration)
+
+        stats = summarize(samples)
+        self.stdout.write(
+            "search: {count} queries, {rps:.1f} q/s, p50 {p50_ms:.1f} ms, "
+            "p95 {p95_ms:.1f} ms, p99 {p99_ms:.1f} ms".format(**stats)
+        )
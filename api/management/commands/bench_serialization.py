@@ -0,0 +1,70 @@
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.benchmarks import isolated_database, timed
+from api.models import Product
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import ProductImageSerializer, ProductSerializer
+from api.synthetic import generate_dataset
+
+
+class RegularImageSerializer(ProductImageSerializer):
+    class Meta(ProductImageSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
+
+
+class RegularProductSerializer(ProductSerializer):
+    images = RegularImageSerializer(many=True, read_only=True)
+
+    class Meta(ProductSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Time serializing and rendering a product list (with images): DRF's "
+        "ListSerializer + stdlib JSONRenderer versus the lean list path + "
+        "FastJSONRenderer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10_000)
+        parser.add_argument('--images', type=int, default=2, help="Images per product.")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            generate_dataset(options['products'], users=0, carts=0, orders=0,
+                             images_per_product=options['images'])
+            products = list(Product.objects.prefetch_related('images').order_by('-created_at'))
+
+        request = Request(RequestFactory().get('/api/products/'))
+        variants = {
+            'before': (RegularProductSerializer, JSONRenderer()),
+            'after': (ProductSerializer, FastJSONRenderer()),
+        }
+        self.stdout.write(
+            f"{len(products)} products, orjson {'installed' if orjson else 'not installed'}"
+        )
+        bodies = {}
+        for name, (serializer_class, renderer) in variants.items():
+            serialize, render = [], []
+            for _ in range(options['repeat']):
+                serializer = serializer_class(products, many=True, context={'request': request})
+                elapsed, data = timed(lambda: serializer.data)
+                serialize.append(elapsed)
+                elapsed, bodies[name] = timed(renderer.render, data)
+                render.append(elapsed)
+            serialize_ms = statistics.median(serialize) * 1000
+            render_ms = statistics.median(render) * 1000
+            self.stdout.write(
+                f"{name:<7} serialize {serialize_ms:>8.1f} ms  render {render_ms:>8.1f} ms  "
+                f"total {serialize_ms + render_ms:>8.1f} ms  ({len(bodies[name])} bytes)"
+            )
+        if bodies['before'] != bodies['after']:
+            raise CommandError("The lean path rendered a different body.")
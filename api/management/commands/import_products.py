@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bulk import import_products, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or NDJSON supplier catalog into Product, upserting on code."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or - for stdin.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--rejects', help="Write rejected rows as NDJSON to this file.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            extension = os.path.splitext(path)[1].lower().lstrip('.')
+            fmt = {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension)
+            if fmt is None:
+                raise CommandError("No se pudo deducir el formato; use --format.")
+
+        if path == '-':
+            report = import_products(iter_rows(sys.stdin, fmt), options['batch_size'])
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8')
+            except OSError as e:
+                raise CommandError(str(e))
+            with stream:
+                report = import_products(iter_rows(stream, fmt), options['batch_size'])
+
+        if options['rejects'] and report.rejected:
+            with open(options['rejects'], 'w', encoding='utf-8') as out:
+                for reject in report.rejected:
+                    out.write(json.dumps(reject, ensure_ascii=False) + '\n')
+
+        self.stdout.write(
+            f"{report.rows} filas leídas, {report.imported} importadas, "
+            f"{len(report.rejected)} rechazadas en {report.elapsed:.1f}s "
+            f"({report.rows_per_second:.0f} filas/s)"
+        )
+        for reject in report.rejected[:10]:
+            self.stderr.write(f"línea {reject['line']}: {reject['errors']}")
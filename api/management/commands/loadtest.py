@@ -0,0 +1,87 @@
+import asyncio
+import resource
+import shutil
+import socket
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import load, percentile
+
+SERVERS = {
+    'asgi': lambda port, workers: [
+        'uvicorn', 'Backend_copiaMercadolibre.asgi:application',
+        '--port', str(port), '--workers', str(workers), '--no-access-log',
+    ],
+    'wsgi': lambda port, workers: [
+        'gunicorn', 'Backend_copiaMercadolibre.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', '8',
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test an endpoint at high concurrency. With --serve, start the "
+        "project under uvicorn (asgi) and/or gunicorn (wsgi) and compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/async/products/',
+                            help="Path to request on each server.")
+        parser.add_argument('--url', help="Full URL of an already running server (skips --serve).")
+        parser.add_argument('--serve', default='asgi,wsgi',
+                            help="Comma-separated servers to start: asgi, wsgi.")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--concurrency', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--header', action='append', default=[],
+                            help="Extra request header, e.g. 'Authorization: Bearer ...'.")
+
+    def handle(self, *args, **options):
+        # Every connection needs a file descriptor on this side.
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = options['concurrency'] + 256
+        if soft < wanted:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+        self.stdout.write(f"{'server':>8} {'rps':>9} {'p50':>9} {'p99':>9} {'errors':>7}")
+        if options['url']:
+            self.report('url', options['url'], options)
+            return
+
+        for name in options['serve'].split(','):
+            if name not in SERVERS:
+                raise CommandError(f"Servidor desconocido: {name}")
+            command = SERVERS[name](options['port'], options['workers'])
+            if not shutil.which(command[0]):
+                raise CommandError(f"{command[0]} no está instalado.")
+            server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                self.wait_for_port(options['port'])
+                self.report(name, f"http://127.0.0.1:{options['port']}{options['path']}", options)
+            finally:
+                server.terminate()
+                server.wait()
+
+    def report(self, name, url, options):
+        samples, errors, elapsed = asyncio.run(
+            load(url, options['concurrency'], options['requests'], options['header'])
+        )
+        self.stdout.write(
+            f"{name:>8} {len(samples) / elapsed:>9.0f} "
+            f"{percentile(samples, 50) * 1000:>7.1f}ms {percentile(samples, 99) * 1000:>7.1f}ms "
+            f"{len(errors):>7}"
+        )
+
+    def wait_for_port(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"El servidor no respondió en el puerto {port}.")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.images import process_image
+from api.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = "Generate variants for product images that have not been processed yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Reprocess every image, not only pending ones.")
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.all() if options['all'] else ProductImage.objects.exclude(status='READY')
+        ids = list(images.values_list('pk', flat=True))
+        for image_id in ids:
+            process_image(image_id)
+        failed = ProductImage.objects.filter(pk__in=ids, status='FAILED').count()
+        self.stdout.write(f"{len(ids)} imágenes procesadas, {failed} con error.")
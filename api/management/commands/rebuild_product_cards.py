@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from api.cards import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the catalog cards (?view=card) from products and their images."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{rebuild()} tarjetas de producto.")
@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import SalesRollup
+from api.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard sales rollups from orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild from this date (YYYY-MM-DD), rounded down to the month.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("--since debe tener el formato YYYY-MM-DD")
+        rebuild(since=since)
+        self.stdout.write(f"{SalesRollup.objects.count()} filas de resumen.")
@@ -0,0 +1,302 @@
+"""
+Per-request query and latency instrumentation.
+
+`RequestMetricsMiddleware` samples a fraction of requests (REQUEST_METRICS
+SAMPLE_RATE). For a sampled request it records the query count, database
+time, time spent in view code outside the database, response rendering and
+total time. It reports them in a `Server-Timing` header and in per-process
+Prometheus histograms served by `/api/metrics/`. Unsampled requests only pay
+for one random draw and a context variable lookup per query.
+
+Queries are seen through a database execute wrapper installed on every
+connection (see `instrument_connection`). The current request's recorder
+lives in a context variable, so queries issued from `sync_to_async` threads
+by the async views are attributed too.
+"""
+import contextvars
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.1,
+    # Identical SQL shapes run this many times in one request count as N+1.
+    'N_PLUS_ONE_THRESHOLD': 3,
+    'SERVER_TIMING': True,
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_recorder = contextvars.ContextVar('request_metrics', default=None)
+
+# Placeholder runs such as "IN (%s, %s, %s)" differ only in length.
+PLACEHOLDERS_RE = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {}))
+
+
+def sql_shape(sql):
+    return PLACEHOLDERS_RE.sub('%s, ...', sql)
+
+
+class QueryRecorder:
+    """Queries and database time seen while it is the active recorder."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+
+    def repeated(self, threshold):
+        """`{shape: times}` for SQL shapes run at least `threshold` times."""
+        return {shape: times for shape, times in self.shapes.items() if times >= threshold}
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.db_time += time.perf_counter() - start
+        recorder.count += 1
+        recorder.shapes[sql_shape(sql)] += 1
+
+
+def instrument_connection(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def recording():
+    """Record every query run in this context (and tasks/threads it spawns)."""
+    recorder = QueryRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+
+    def __init__(self, name, help_text, buckets, labels=('view', 'method')):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), count, total) for labels, (counts, count, total) in self._series.items()}
+        for label_values, (counts, count, total) in sorted(series.items()):
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class CounterMetric:
+    def __init__(self, name, help_text, labels=('view', 'method')):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+REQUEST_SECONDS = Histogram('api_request_duration_seconds', "Total time per sampled request.", LATENCY_BUCKETS)
+DB_SECONDS = Histogram('api_request_db_seconds', "Database time per sampled request.", LATENCY_BUCKETS)
+APP_SECONDS = Histogram(
+    'api_request_app_seconds',
+    "View time outside the database (permissions, serializers) per sampled request.",
+    LATENCY_BUCKETS,
+)
+RENDER_SECONDS = Histogram('api_request_render_seconds', "Response rendering time per sampled request.", LATENCY_BUCKETS)
+QUERIES = Histogram('api_request_queries', "SQL queries per sampled request.", QUERY_BUCKETS)
+N_PLUS_ONE = CounterMetric('api_n_plus_one_total', "Sampled requests that repeated an SQL shape.")
+
+METRICS = (REQUEST_SECONDS, DB_SECONDS, APP_SECONDS, RENDER_SECONDS, QUERIES, N_PLUS_ONE)
+
+
+def expose():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in METRICS:
+        metric.clear()
+
+
+class RequestTiming:
+    """Timestamps and query recorder for one sampled request."""
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.start = time.perf_counter()
+        self.view_start = self.view_end = self.render_end = None
+        self.view_db_time = 0.0
+
+    def phases(self, end):
+        view_end = self.view_end or end
+        app = render = 0.0
+        if self.view_start is not None:
+            app = max(view_end - self.view_start - self.view_db_time, 0.0)
+        if self.view_end is not None and self.render_end is not None:
+            render = self.render_end - self.view_end
+        return {
+            'db': self.recorder.db_time,
+            'app': app,
+            'render': render,
+            'total': end - self.start,
+        }
+
+
+class RequestMetricsMiddleware:
+    """
+    Sample requests and record their query and latency profile.
+
+    Put it first in MIDDLEWARE so `total` covers the rest of the stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = get_options()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sample():
+            return self.get_response(request)
+        with recording() as recorder:
+            request._metrics = RequestTiming(recorder)
+            response = self.get_response(request)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        if not self.sample():
+            return await self.get_response(request)
+        with recording() as recorder:
+            request._metrics = RequestTiming(recorder)
+            response = await self.get_response(request)
+        return self.finish(request, response)
+
+    def sample(self):
+        rate = self.options['SAMPLE_RATE']
+        if rate <= 0:
+            return False
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(connection)
+        return rate >= 1 or random.random() < rate
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = getattr(request, '_metrics', None)
+        if timing is not None:
+            timing.view_start = time.perf_counter()
+            timing.view_db_time = -timing.recorder.db_time
+
+    def process_template_response(self, request, response):
+        # Called between the view returning and the response being rendered.
+        timing = getattr(request, '_metrics', None)
+        if timing is not None:
+            self.mark_view_end(timing)
+            response.add_post_render_callback(lambda _: setattr(timing, 'render_end', time.perf_counter()))
+        return response
+
+    def mark_view_end(self, timing):
+        timing.view_end = time.perf_counter()
+        timing.view_db_time += timing.recorder.db_time
+
+    def finish(self, request, response):
+        timing = request._metrics
+        end = time.perf_counter()
+        if timing.view_start is not None and timing.view_end is None:
+            # Plain HttpResponse: nothing was left to render.
+            self.mark_view_end(timing)
+        phases = timing.phases(end)
+        recorder = timing.recorder
+
+        match = request.resolver_match
+        labels = (match.view_name if match else 'unmatched', request.method)
+        REQUEST_SECONDS.observe(labels, phases['total'])
+        DB_SECONDS.observe(labels, phases['db'])
+        APP_SECONDS.observe(labels, phases['app'])
+        RENDER_SECONDS.observe(labels, phases['render'])
+        QUERIES.observe(labels, recorder.count)
+
+        repeated = recorder.repeated(self.options['N_PLUS_ONE_THRESHOLD'])
+        if repeated:
+            N_PLUS_ONE.inc(labels)
+            shape, times = max(repeated.items(), key=lambda item: item[1])
+            logger.warning("Possible N+1 in %s %s: %d identical queries: %s", request.method, labels[0], times, shape)
+
+        if self.options['SERVER_TIMING']:
+            descriptions = {'db': f';desc="{recorder.count} queries"'}
+            response['Server-Timing'] = ', '.join(
+                f"{name}{descriptions.get(name, '')};dur={value * 1000:.2f}" for name, value in phases.items()
+            )
+        return response
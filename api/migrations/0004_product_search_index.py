@@ -0,0 +1,41 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+INDEX_NAME = 'product_search_idx'
+
+
+def search_index():
+    # Must match api.search.product_search_vector() exactly.
+    vector = (
+        SearchVector('name', weight='A', config='spanish')
+        + SearchVector('brand', weight='B', config='spanish')
+        + SearchVector('category', weight='B', config='spanish')
+        + SearchVector('description', weight='C', config='spanish')
+    )
+    return GinIndex(vector, name=INDEX_NAME)
+
+
+def create_search_index(apps, schema_editor):
+    # Full-text search only exists on PostgreSQL; other backends use the
+    # in-process inverted index in api.search.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('api', 'Product'), search_index())
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('api', 'Product'), search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('period', models.DateField()),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('product', 'Product'), ('category', 'Category'), ('brand', 'Brand')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'dimension', 'period'], name='salesrollup_range_idx')],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'dimension', 'key', 'period'), name='salesrollup_unique_bucket')],
+            },
+        ),
+    ]
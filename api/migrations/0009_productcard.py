@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_indexes_and_cartitem_uniqueness'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('brand', models.CharField(max_length=50)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('in_stock', models.BooleanField()),
+                ('image', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='card', to='api.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-created_at', 'id'], name='productcard_created_id_idx')],
+            },
+        ),
+    ]
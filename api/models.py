@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractUser
 
@@ -12,7 +16,16 @@ class Product(models.Model):
     category = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-   
+
+    class Meta:
+        indexes = [
+            # Matches KeysetPagination.ordering for the catalog list.
+            models.Index(fields=['-created_at', 'id'], name='product_created_id_idx'),
+            # Brand/category filters (search, admin list_filter) keep the
+            # catalog order and serve the facet GROUP BYs.
+            models.Index(fields=['category', '-created_at', 'id'], name='product_category_created_idx'),
+            models.Index(fields=['brand', '-created_at', 'id'], name='product_brand_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.code} - {self.name}"
@@ -24,9 +37,20 @@ class Product(models.Model):
         return self.created_at.strftime("%d/%m/%Y %H:%M")
 
 class ProductImage(models.Model):
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('READY', 'Ready'),
+        ('FAILED', 'Failed'),
+    ]
+
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='products/', max_length=500)
     is_main = models.BooleanField(default=False)
+    # Filled in by api.images once the upload has been processed.
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    variants = models.JSONField(default=dict, blank=True)
     
     def __str__(self):
         return f"Imagen de{self.product.name}"
@@ -38,6 +62,11 @@ class Order(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='order_created_id_idx'),
+        ]
     
     def __str__(self):
         return f"Orden {self.id} - {self.product.name} x {self.quantity}" 
@@ -61,6 +90,15 @@ class User(AbstractUser):
     date_birth = models.DateField(blank=True, null=True)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='CUSTOMER')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped to invalidate every token issued so far (see api.authentication).
+    token_version = models.PositiveIntegerField(default=0)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Admin changelist: ordered by -created_at, filtered by role.
+            models.Index(fields=['-created_at', 'id'], name='user_created_id_idx'),
+            models.Index(fields=['role', '-created_at'], name='user_role_created_idx'),
+        ]
     
     # We remove explicit first_name, last_name, username, password, is_staff, is_active
     # as they are inherited from AbstractUser.
@@ -76,29 +114,77 @@ class User(AbstractUser):
     
     def is_customer(self):
         return self.role == 'CUSTOMER'
+
+    def revoke_tokens(self):
+        """Invalidate all access and refresh tokens issued to this user."""
+        self.token_version = F('token_version') + 1
+        # save() rather than update() so post_save drops the cached auth state.
+        self.save(update_fields=['token_version'])
+        self.refresh_from_db(fields=['token_version'])
     
     def is_staff_member(self):
         return self.role == 'STAFF'
 
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate item count and total price so they come back in the same
+        query as the carts instead of one aggregate per cart.
+        """
+        return self.annotate(
+            _total_items=Coalesce(Sum('cartitem__quantity'), 0),
+            _total_price=Coalesce(
+                Sum(F('cartitem__quantity') * F('cartitem__current_price')),
+                Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+    def with_validators(self):
+        """
+        Annotate what a cart's representation depends on: its lines and
+        their products. Joins the same rows as with_totals().
+        """
+        return self.annotate(
+            _lines=Count('cartitem'),
+            _items_updated_at=Max('cartitem__updated_at'),
+            _products_updated_at=Max('cartitem__product__updated_at'),
+        )
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     products = models.ManyToManyField(Product, through='CartItem')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='cart_created_id_idx'),
+        ]
     
     def __str__(self):
         return f"Carrito de {self.user.first_name} {self.user.last_name}"
     
+    @property
+    def last_modified(self):
+        """Latest change to the cart, its lines or their products (needs with_validators)."""
+        return max(filter(None, (self.updated_at, self._items_updated_at, self._products_updated_at)))
+
     @property
     def total_items(self):
+        if hasattr(self, '_total_items'):
+            return self._total_items
         return self.cartitem_set.aggregate(total=models.Sum('quantity'))['total'] or 0
     
     @property
     def total_price(self):
-        total = 0
-        for item in self.cartitem_set.all():
-            total += item.quantity * item.current_price
-        return total
+        if hasattr(self, '_total_price'):
+            return self._total_price
+        return self.cartitem_set.aggregate(
+            total=Sum(F('quantity') * F('current_price'))
+        )['total'] or 0
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
@@ -107,6 +193,15 @@ class CartItem(models.Model):
     current_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='cartitem_created_id_idx'),
+        ]
+        constraints = [
+            # One line per product in a cart; also serves (cart, product) lookups.
+            models.UniqueConstraint(fields=['cart', 'product'], name='cartitem_cart_product_uniq'),
+        ]
     
     def __str__(self):
         return f"{self.quantity} {self.product.name} en el carrito de {self.cart.user.username}"
@@ -124,4 +219,69 @@ class CartItem(models.Model):
     
     @property
     def subtotal(self):
-        return self.quantity * self.current_price
\ No newline at end of file
+        return self.quantity * self.current_price
+
+
+class SalesRollup(models.Model):
+    """
+    Pre-aggregated order totals per period and dimension, maintained
+    incrementally by api.rollups and rebuildable with `rebuild_rollups`.
+    The `total` dimension (empty key) holds the overall figures.
+    """
+    GRANULARITY_CHOICES = [
+        ('day', 'Day'),
+        ('month', 'Month'),
+    ]
+    DIMENSION_CHOICES = [
+        ('total', 'Total'),
+        ('product', 'Product'),
+        ('category', 'Category'),
+        ('brand', 'Brand'),
+    ]
+
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    period = models.DateField()
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=50, blank=True)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'dimension', 'key', 'period'],
+                name='salesrollup_unique_bucket',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'dimension', 'period'], name='salesrollup_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.granularity} {self.period} {self.dimension}={self.key}: {self.revenue}"
+
+class ProductCard(models.Model):
+    """
+    Denormalized catalog card, one per product, maintained by api.cards in
+    the same transaction as the product/image/stock write it reflects and
+    rebuildable with `rebuild_product_cards`. `created_at`/`updated_at` are
+    the product's, so the card list pages and validates like the catalog.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='card')
+    name = models.CharField(max_length=50)
+    brand = models.CharField(max_length=50)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    in_stock = models.BooleanField()
+    # Main image URL as storage.url() gives it (host-relative for local media).
+    image = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='productcard_created_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tarjeta de {self.name}"
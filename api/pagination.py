@@ -0,0 +1,207 @@
+import base64
+import json
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counts import count_rows
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite, strictly ordered key.
+
+    Unlike offset pagination (and DRF's CursorPagination, which keeps an
+    offset for ties), every page is fetched with a `WHERE (key) > (cursor)`
+    predicate plus `LIMIT`, so page N costs the same as page 1 as long as an
+    index matching `ordering` exists.
+
+    The cursor is an opaque urlsafe-base64 token holding the key of the
+    boundary row and the paging direction.
+
+    Pages carry no total unless asked with `?count=1`, which adds `count`
+    (from `api.counts.count_rows`, so possibly an estimate on large tables)
+    and `count_estimated`.
+    """
+    ordering = ('-created_at', 'id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'API_PAGE_SIZE', 20)
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+        self.count = self.count_estimated = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.set_page(list(self.get_page_queryset(queryset, request)))
+        if self.wants_count(request):
+            self.count, self.count_estimated = count_rows(queryset)
+        return page
+
+    async def apaginate_queryset(self, queryset, request):
+        """Async variant for views using the async ORM."""
+        page = self.set_page([obj async for obj in self.get_page_queryset(queryset, request)])
+        if self.wants_count(request):
+            self.count, self.count_estimated = await sync_to_async(count_rows)(queryset)
+        return page
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_page_queryset(self, queryset, request):
+        """Return the sliced queryset for the requested page (one extra row)."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.limit = self.get_page_size(request)
+        self.fields = [self._split(term) for term in self.ordering]
+        cursor = self.decode_cursor(request, queryset.model, self.fields)
+
+        if cursor is None:
+            self.position, self.reverse = None, False
+        else:
+            self.position, self.reverse = cursor
+
+        queryset = queryset.order_by(*self._order_terms(self.fields, self.reverse))
+        if self.position is not None:
+            queryset = queryset.filter(self._after(self.fields, self.position, self.reverse))
+        return queryset[:self.limit + 1]
+
+    def set_page(self, results):
+        has_following = len(results) > self.limit
+        results = results[:self.limit]
+        if self.reverse:
+            results.reverse()
+
+        # Going forwards there is a previous page whenever we started from a
+        # cursor; going backwards there is always a next page.
+        if self.reverse:
+            self.has_next = self.position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        fields = []
+        if self.count is not None:
+            fields += [('count', self.count), ('count_estimated', self.count_estimated)]
+        fields += [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        return Response(OrderedDict(fields))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'count_estimated': {'type': 'boolean'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            size = int(value)
+        except (TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Backwards past the first row: the next page starts from the top.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        payload = {
+            'p': [self._field(obj, name).value_to_string(obj) for name, _ in self.fields],
+            'r': int(reverse),
+        }
+        token = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        ).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model, fields):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            values = payload['p']
+            if len(values) != len(fields):
+                raise ValueError
+            position = [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(fields, values)
+            ]
+            reverse = bool(int(payload.get('r', 0)))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def to_html(self):
+        return ''
+
+    def _split(self, term):
+        if term.startswith('-'):
+            return term[1:], True
+        return term, False
+
+    def _field(self, obj, name):
+        return obj._meta.get_field(name)
+
+    def _order_terms(self, fields, reverse):
+        terms = []
+        for name, descending in fields:
+            if descending != reverse:
+                terms.append('-' + name)
+            else:
+                terms.append(name)
+        return terms
+
+    def _after(self, fields, position, reverse):
+        """
+        Build the lexicographic "row comes after position" predicate:
+        (a < x) OR (a = x AND b > y) OR ...
+        """
+        predicate = Q()
+        for index, (name, descending) in enumerate(fields):
+            lookup = 'lt' if descending != reverse else 'gt'
+            clause = Q(**{
+                fields[i][0]: position[i] for i in range(index)
+            }) & Q(**{'%s__%s' % (name, lookup): position[index]})
+            predicate |= clause
+        return predicate
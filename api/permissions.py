@@ -24,6 +24,10 @@ class IsOwnerOrAdmin(permissions.BasePermission):
             return False
         if get_role(request.user) == 'ADMIN':
             return True
+        # Owned objects (carts) carry a `user`; a User owns itself. Compare
+        # ids so the owner row is not loaded.
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == request.user.pk
         return obj == request.user
 
 
@@ -0,0 +1,48 @@
+import re
+from contextlib import contextmanager
+
+# SQLite reports "SCAN <table>" for a full table walk and adds "USING
+# [COVERING] INDEX" when it walks an index instead.
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)\b(?!.*\bUSING\b)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def explain(connection, sql):
+    """Plan lines for one captured, already interpolated SELECT."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def full_scans(connection, sql):
+    """Tables `sql` reads with a sequential scan."""
+    pattern = SQLITE_SCAN if connection.vendor == 'sqlite' else POSTGRES_SCAN
+    tables = set()
+    for line in explain(connection, sql):
+        match = pattern.search(line.strip())
+        if match:
+            tables.add(match.group(1))
+    return tables
+
+
+@contextmanager
+def prefer_indexes(connection):
+    """
+    On PostgreSQL, make the planner pick an index whenever one applies.
+
+    Test tables are tiny, so a sequential scan is always cheapest there; this
+    way a "Seq Scan" in the plan means no usable index exists.
+    """
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
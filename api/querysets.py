@@ -0,0 +1,108 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+@lru_cache(maxsize=None)
+def get_fetch_plan(model, serializer_class):
+    """
+    Work out which relations `serializer_class` reads from `model`.
+
+    Returns a tuple `(select, prefetch)` where `select` are lookups to pass to
+    `select_related` and `prefetch` is a tuple of `(lookup, related_model,
+    nested_serializer_class)` to turn into `Prefetch` objects. The plan only
+    depends on the classes, so it is computed once per process.
+    """
+    select = set()
+    prefetch = {}
+    _collect(model, serializer_class(), '', select, prefetch)
+    return tuple(sorted(select)), tuple(
+        (lookup,) + prefetch[lookup] for lookup in sorted(prefetch)
+    )
+
+
+def _collect(model, serializer, prefix, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            nested = field.child
+        elif isinstance(field, serializers.BaseSerializer):
+            nested = field
+        else:
+            nested = None
+
+        current = model
+        path = []
+        attrs = field.source_attrs
+        for position, attr in enumerate(attrs):
+            relation = _get_field(current, attr)
+            if relation is None or not relation.is_relation:
+                break
+            if attr != relation.name and attr == getattr(relation, 'attname', None):
+                # `<fk>_id` reads the local column; nothing to join.
+                break
+
+            last = position == len(attrs) - 1
+            lookup = prefix + '__'.join(path + [attr])
+
+            if relation.one_to_many or relation.many_to_many:
+                nested_class = type(nested) if last and nested is not None else None
+                prefetch[lookup] = (relation.related_model, nested_class)
+                break
+
+            if (last and nested is None and isinstance(field, serializers.RelatedField)
+                    and field.use_pk_only_optimization()):
+                # PrimaryKeyRelatedField only needs the local <name>_id column.
+                break
+
+            select.add(lookup)
+            path.append(attr)
+            current = relation.related_model
+            if last and nested is not None:
+                _collect(current, nested, lookup + '__', select, prefetch)
+
+
+def _get_field(model, attr):
+    try:
+        return model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        pass
+    # Serializers name reverse relations by accessor (e.g. `cartitem_set`),
+    # which get_field() does not know about.
+    for relation in model._meta.related_objects:
+        if relation.get_accessor_name() == attr:
+            return relation
+    return None
+
+
+def optimize_queryset(queryset, serializer_class):
+    """
+    Apply the `select_related`/`prefetch_related` calls `serializer_class`
+    needs, so serializing any number of rows costs a fixed number of queries.
+    """
+    select, prefetch = get_fetch_plan(queryset.model, serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    for lookup, related_model, nested_class in prefetch:
+        related = related_model._default_manager.all()
+        if nested_class is not None:
+            related = optimize_queryset(related, nested_class)
+        queryset = queryset.prefetch_related(Prefetch(lookup, queryset=related))
+    return queryset
+
+
+class OptimizedQuerysetMixin:
+    """
+    ViewSet mixin that derives related-object loading from the serializer.
+
+    Hooks into `filter_queryset` so it also applies to views that override
+    `get_queryset`.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return optimize_queryset(queryset, self.get_serializer_class())
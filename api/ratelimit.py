@@ -0,0 +1,226 @@
+import ipaddress
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    # 'cache' shares buckets across workers through the cache backend;
+    # 'local' keeps them in process memory.
+    'BACKEND': 'cache',
+    'ALIAS': 'default',
+    # (capacity, tokens refilled per second)
+    'IP': (20, 0.2),
+    'ACCOUNT': (5, 1 / 60),
+    # Networks (CIDR) of the load balancers/proxies in front of the app.
+    # Only they are believed about X-Forwarded-For.
+    'TRUSTED_PROXIES': (),
+}
+
+
+class TokenBucket:
+    """
+    Token bucket shared by both storage flavours: `capacity` tokens, refilled
+    continuously at `rate` per second, kept as `(tokens, stamp)` per key.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+
+    def _refill(self, state, now):
+        if state is None:
+            return float(self.capacity)
+        tokens, stamp = state
+        return min(float(self.capacity), tokens + (now - stamp) * self.rate)
+
+    def _take(self, state, now):
+        """`(allowed, retry_after, new_state)` for one request."""
+        tokens = self._refill(state, now)
+        if tokens >= 1:
+            return True, 0, (tokens - 1, now)
+        retry_after = math.ceil((1 - tokens) / self.rate) if self.rate else None
+        return False, retry_after, (tokens, now)
+
+    def consume(self, key):
+        """
+        Take one token for `key`. Returns `(allowed, retry_after)`, with
+        retry_after in whole seconds (None if the bucket never refills).
+        """
+        raise NotImplementedError
+
+    def refund(self, key):
+        """Give back a token taken by `consume`."""
+        raise NotImplementedError
+
+
+class LocalTokenBucket(TokenBucket):
+    """Per-process buckets; old entries are dropped once past `max_entries`."""
+
+    def __init__(self, capacity, rate, max_entries=10_000):
+        super().__init__(capacity, rate)
+        self.max_entries = max_entries
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) >= self.max_entries and key not in self._buckets:
+                self._prune(now)
+            allowed, retry_after, state = self._take(self._buckets.get(key), now)
+            self._buckets[key] = state
+        return allowed, retry_after
+
+    def refund(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if key in self._buckets:
+                tokens = self._refill(self._buckets[key], now)
+                self._buckets[key] = (min(float(self.capacity), tokens + 1), now)
+
+    def _prune(self, now):
+        # Full buckets carry no information; forget them first.
+        self._buckets = {
+            key: state for key, state in self._buckets.items()
+            if self._refill(state, now) < self.capacity
+        }
+        while len(self._buckets) >= self.max_entries:
+            self._buckets.pop(next(iter(self._buckets)))
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheTokenBucket(TokenBucket):
+    """
+    Buckets stored in a Django cache so every worker shares them.
+
+    The cache cannot update `(tokens, stamp)` atomically, so this counts
+    takes with `add`/`incr` instead, in windows of `capacity / rate` seconds
+    (the time an empty bucket takes to fill). The previous window's count
+    is weighted by how much of it still overlaps the last `window` seconds.
+    That approximates the bucket, and concurrent workers can never both
+    take the last token.
+    """
+
+    def __init__(self, capacity, rate, prefix, alias='default'):
+        super().__init__(capacity, rate)
+        self.prefix = prefix
+        self.alias = alias
+        self.window = capacity / rate if rate else None
+
+    def _keys(self, key, now):
+        """`(current, previous, elapsed)`: window keys and the fraction of the current one gone."""
+        base = f"ratelimit:{self.prefix}:{key}"
+        if self.window is None:
+            return base, None, 0.0
+        index, elapsed = divmod(now / self.window, 1)
+        return f"{base}:{int(index)}", f"{base}:{int(index) - 1}", elapsed
+
+    def _incr(self, cache, cache_key, delta=1):
+        # A window lives through the next one, where it is the previous.
+        timeout = math.ceil(2 * self.window) if self.window else None
+        cache.add(cache_key, 0, timeout)
+        try:
+            return cache.incr(cache_key, delta)
+        except ValueError:
+            # Expired between add and incr.
+            cache.add(cache_key, delta, timeout)
+            return delta
+
+    def consume(self, key):
+        cache = caches[self.alias]
+        # Wall clock, since the windows are shared between processes.
+        current, previous, elapsed = self._keys(key, time.time())
+        count = self._incr(cache, current)
+        earlier = cache.get(previous, 0) if previous else 0
+        if earlier * (1 - elapsed) + count <= self.capacity:
+            return True, 0
+        self._incr(cache, current, -1)
+        return False, self._retry_after(count - 1, earlier, elapsed)
+
+    def _retry_after(self, count, earlier, elapsed):
+        """Seconds until one more take fits next to `count` and `earlier`."""
+        if self.window is None:
+            return None
+        if count + 1 > self.capacity:
+            # Not this window: wait for this one's weight to fall far enough.
+            remaining = (1 - elapsed) + (1 - (self.capacity - 1) / count)
+        else:
+            remaining = (1 - (self.capacity - count - 1) / earlier) - elapsed
+        return max(1, math.ceil(remaining * self.window))
+
+    def refund(self, key):
+        cache = caches[self.alias]
+        current, _, _ = self._keys(key, time.time())
+        try:
+            if cache.decr(current) < 0:
+                cache.incr(current)
+        except ValueError:
+            # The take was counted in a window that has since rolled over.
+            pass
+
+
+class LoginRateLimiter:
+    """
+    Per-IP and per-account buckets checked before any password is hashed.
+    A successful login gives its account token back, so only failed
+    attempts count against an account.
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULTS, **(options or {}))
+        self.buckets = {scope: self._make_bucket(scope) for scope in ('ip', 'account')}
+        self.trusted_proxies = [ipaddress.ip_network(net) for net in self.options['TRUSTED_PROXIES']]
+
+    def _make_bucket(self, scope):
+        capacity, rate = self.options[scope.upper()]
+        if self.options['BACKEND'] == 'local':
+            return LocalTokenBucket(capacity, rate)
+        return CacheTokenBucket(capacity, rate, f"login:{scope}", self.options['ALIAS'])
+
+    def check(self, ip, account):
+        """Returns None when the attempt may proceed, else seconds to wait."""
+        allowed, retry_after = self.buckets['ip'].consume(ip)
+        if allowed:
+            allowed, retry_after = self.buckets['account'].consume(account.strip().lower())
+        return None if allowed else (retry_after or 0)
+
+    def succeeded(self, account):
+        """Refund the account token of an attempt that authenticated."""
+        self.buckets['account'].refund(account.strip().lower())
+
+    def is_trusted(self, address):
+        try:
+            address = ipaddress.ip_address(address.strip())
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    def client_ip(self, request):
+        """
+        The address the request came from. X-Forwarded-For is read right to
+        left only while each hop is a trusted proxy; the first untrusted
+        address is the client. Without trusted proxies it is REMOTE_ADDR.
+        """
+        address = request.META.get('REMOTE_ADDR', '')
+        if not self.is_trusted(address):
+            return address
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        for hop in reversed([hop.strip() for hop in forwarded.split(',') if hop.strip()]):
+            address = hop
+            if not self.is_trusted(hop):
+                break
+        return address
+
+    def clear(self):
+        for bucket in self.buckets.values():
+            if isinstance(bucket, LocalTokenBucket):
+                bucket.clear()
+
+
+login_limiter = LoginRateLimiter(getattr(settings, 'LOGIN_RATE_LIMIT', None))
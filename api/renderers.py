@@ -0,0 +1,68 @@
+"""
+JSON renderer and parser backed by orjson when it is installed.
+
+orjson is optional: without it (or for anything it cannot handle) both
+classes fall back to DRF's stdlib implementation, and the output is the same
+either way. Types orjson does not encode natively are passed to DRF's
+`JSONEncoder.default`, so Decimal, lazy strings, querysets, etc. come out
+exactly as they would through `JSONRenderer`. Datetimes are routed through
+it too, since DRF writes UTC as "Z" where orjson writes "+00:00".
+"""
+import codecs
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser, get_encoding
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+# orjson leaves these as raw UTF-8; JSONRenderer escapes them so the output
+# stays a strict JavaScript subset.
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """`JSONRenderer` with orjson doing the encoding of compact output."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            # Pretty-printing (the browsable API, `; indent=4`) is not a hot path.
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except TypeError:
+            # Integers over 64 bits, NaN in non-strict mode and the like.
+            return super().render(data, accepted_media_type, renderer_context)
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """`JSONParser` with orjson doing the decoding of UTF-8 bodies."""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = get_encoding(parser_context or {})
+        if orjson is None or not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # Let the stdlib have the last word: it accepts what orjson
+            # refuses (e.g. integers over 64 bits) and words the error.
+            try:
+                return json.loads(body.decode(encoding), parse_constant=json.strict_constant)
+            except ValueError as exc:
+                raise ParseError('JSON parse error - %s' % str(exc))
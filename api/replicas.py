@@ -0,0 +1,160 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+`ReplicaRouter` sends ORM reads to the alias chosen for the current request
+and every write to the primary. Reads only leave the primary inside a view
+that opts in (`ReplicaReadMixin` for viewsets, `replica_reads` for function
+views), for safe methods, and when the user has not written recently.
+Otherwise they stay on the primary.
+
+A successful unsafe request by an authenticated user pins that user to the
+primary for STICKY_SECONDS (`ReplicaPinMiddleware`). This hides replication
+lag from them, so a product they just edited or a cart they just checked out
+reads back as written. Pins live in the shared cache, so they hold across
+workers when REDIS_URL is set.
+
+Views with a response cache (CachedReadMixin) also stay on the primary for
+STICKY_SECONDS after that cache is invalidated. Otherwise the first miss
+after a write could cache the replica's pre-write rows under the new version
+and serve them to everyone, the writer included, for the cache's TIMEOUT.
+
+Replica aliases are listed in READ_REPLICAS['ALIASES']. With none, all of
+this is a no-op.
+"""
+import contextvars
+import functools
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+DEFAULTS = {
+    'ALIASES': (),
+    # How long a user's reads stay on the primary after they write.
+    'STICKY_SECONDS': 5,
+    'CACHE_ALIAS': 'default',
+}
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def get_options():
+    return dict(DEFAULTS, **getattr(settings, 'READ_REPLICAS', {}))
+
+
+def pin_key(user):
+    return f"replicas:pin:{user.pk}"
+
+
+def pin(user, options=None):
+    """Keep `user`'s reads on the primary for STICKY_SECONDS."""
+    options = options or get_options()
+    caches[options['CACHE_ALIAS']].set(pin_key(user), 1, options['STICKY_SECONDS'])
+
+
+def is_pinned(user, options=None):
+    options = options or get_options()
+    return caches[options['CACHE_ALIAS']].get(pin_key(user)) is not None
+
+
+def choose_replica(request, response_cache=None):
+    """
+    The replica alias `request`'s reads may use, or None for the primary.
+    A random replica is picked once per request, so all of its reads see
+    the same snapshot. `response_cache` is the ResponseCache the view fills.
+    """
+    options = get_options()
+    if not options['ALIASES'] or request.method not in SAFE_METHODS:
+        return None
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and is_pinned(user, options):
+        return None
+    if response_cache is not None and response_cache.invalidated_within(options['STICKY_SECONDS']):
+        return None
+    return random.choice(options['ALIASES'])
+
+
+def route_reads(request, response_cache=None):
+    """Send this context's reads to `request`'s replica. Returns a reset token."""
+    return _read_alias.set(choose_replica(request, response_cache))
+
+
+def release(token):
+    if token is not None:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the alias chosen by `route_reads`, writes to the primary.
+
+    Writes are routed explicitly: an instance loaded from a replica would
+    otherwise be saved back to it.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        if db in get_options()['ALIASES']:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    ViewSet mixin letting safe requests read from a replica. The choice is
+    made after authentication, so pinned users are known, and undone
+    however the request ends.
+    """
+    _replica_token = None
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            release(self._replica_token)
+            self._replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._replica_token = route_reads(request, getattr(self, 'response_cache', None))
+
+
+def replica_reads(view):
+    """`ReplicaReadMixin` for function views; apply it under `@api_view`."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = route_reads(request)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            release(token)
+    return wrapper
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """
+    Pin users to the primary after a successful write. Runs on the way out,
+    so it sees the user that DRF authenticated.
+    """
+
+    def process_response(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        options = get_options()
+        user = getattr(request, 'user', None)
+        if options['ALIASES'] and user is not None and user.is_authenticated:
+            pin(user, options)
+        return response
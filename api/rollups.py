@@ -0,0 +1,196 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth
+from django.utils import timezone
+
+from .models import Order, SalesRollup
+
+GRANULARITIES = ('day', 'month')
+UPSERT_BATCH_SIZE = 500
+
+
+def period_start(value, granularity):
+    if granularity == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def next_period(value, granularity):
+    if granularity == 'month':
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return value + timedelta(days=1)
+
+
+def previous_period(value, granularity):
+    if granularity == 'month':
+        return (value.replace(day=1) - timedelta(days=1)).replace(day=1)
+    return value - timedelta(days=1)
+
+
+def periods_between(start, end, granularity):
+    current = period_start(start, granularity)
+    while current <= end:
+        yield current
+        current = next_period(current, granularity)
+
+
+def _dimension_keys(order):
+    product = order.product
+    return (
+        ('total', ''),
+        ('product', str(order.product_id)),
+        ('category', product.category),
+        ('brand', product.brand),
+    )
+
+
+def _upsert(deltas, using):
+    """
+    Add `deltas` to the rollup rows in a single statement:
+    INSERT ... ON CONFLICT (bucket) DO UPDATE SET x = x + excluded.x.
+    Both PostgreSQL and SQLite accept this form, and it cannot lose
+    increments under concurrent writers.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(SalesRollup._meta.db_table)
+    revenue = SalesRollup._meta.get_field('revenue')
+    columns = ', '.join(qn(c) for c in ('granularity', 'period', 'dimension', 'key', 'orders', 'units', 'revenue'))
+    bucket = ', '.join(qn(c) for c in ('granularity', 'dimension', 'key', 'period'))
+    increments = ', '.join(
+        f"{qn(c)} = {table}.{qn(c)} + excluded.{qn(c)}" for c in ('orders', 'units', 'revenue')
+    )
+
+    items = list(deltas.items())
+    for start in range(0, len(items), UPSERT_BATCH_SIZE):
+        chunk = items[start:start + UPSERT_BATCH_SIZE]
+        params = []
+        for (granularity, period, dimension, key), (orders, units, amount) in chunk:
+            params.extend([
+                granularity,
+                connection.ops.adapt_datefield_value(period),
+                dimension,
+                key,
+                orders,
+                units,
+                connection.ops.adapt_decimalfield_value(amount, revenue.max_digits, revenue.decimal_places),
+            ])
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(chunk))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {values} "
+                f"ON CONFLICT ({bucket}) DO UPDATE SET {increments}",
+                params,
+            )
+
+
+def record_orders(orders):
+    """
+    Fold newly created orders into the rollups. Orders must have their
+    product loaded (it is, for orders built from a product instance).
+    Runs in the caller's transaction, so a rolled back order leaves no trace.
+    """
+    deltas = defaultdict(lambda: [0, 0, Decimal('0')])
+    using = None
+    for order in orders:
+        using = using or order._state.db
+        day = timezone.localdate(order.created_at)
+        for granularity in GRANULARITIES:
+            period = period_start(day, granularity)
+            for dimension, key in _dimension_keys(order):
+                bucket = deltas[(granularity, period, dimension, key)]
+                bucket[0] += 1
+                bucket[1] += order.quantity
+                bucket[2] += order.total
+    if deltas:
+        _upsert(deltas, using or router.db_for_write(SalesRollup))
+
+
+def rebuild(since=None, batch_size=5000):
+    """
+    Recompute rollups from Order rows, from `since` (a date) onwards or for
+    all history. Needed after order edits/deletes, which are not tracked
+    incrementally.
+    """
+    tz = timezone.get_current_timezone()
+    truncs = {
+        'day': TruncDay('created_at', tzinfo=tz),
+        'month': TruncMonth('created_at', tzinfo=tz),
+    }
+    key_fields = {
+        'total': None,
+        'product': 'product_id',
+        'category': 'product__category',
+        'brand': 'product__brand',
+    }
+    orders = Order.objects.all()
+    stale = SalesRollup.objects.all()
+    if since is not None:
+        # Whole months are rebuilt so monthly buckets stay complete.
+        since = since.replace(day=1)
+        orders = orders.filter(created_at__date__gte=since)
+        stale = stale.filter(period__gte=since)
+
+    with transaction.atomic():
+        stale.delete()
+        for granularity, trunc in truncs.items():
+            for dimension, key_field in key_fields.items():
+                group = {'bucket': trunc}
+                if key_field:
+                    group['bucket_key'] = F(key_field)
+                rows = (
+                    orders.annotate(**group)
+                    .values(*group)
+                    .annotate(orders=Count('id'), units=Sum('quantity'), revenue=Sum('total'))
+                    .order_by()
+                )
+                SalesRollup.objects.bulk_create((
+                    SalesRollup(
+                        granularity=granularity,
+                        period=row['bucket'].date(),
+                        dimension=dimension,
+                        key=str(row.get('bucket_key', '')),
+                        orders=row['orders'],
+                        units=row['units'] or 0,
+                        revenue=row['revenue'] or 0,
+                    )
+                    for row in rows
+                ), batch_size=batch_size)
+
+
+def series(granularity, start, end, dimension='total', key=''):
+    """
+    Per-period totals between `start` and `end` (inclusive), zero-filled.
+    Reads one rollup row per period.
+    """
+    rows = SalesRollup.objects.filter(
+        granularity=granularity,
+        dimension=dimension,
+        key=key,
+        period__gte=period_start(start, granularity),
+        period__lte=end,
+    ).values_list('period', 'orders', 'units', 'revenue')
+    found = {period: (orders, units, revenue) for period, orders, units, revenue in rows}
+    return [
+        (period,) + found.get(period, (0, 0, Decimal('0')))
+        for period in periods_between(start, end, granularity)
+    ]
+
+
+def breakdown(dimension, granularity, start, end, limit=10):
+    """Top `limit` keys of `dimension` by revenue over the range."""
+    return list(
+        SalesRollup.objects.filter(
+            granularity=granularity,
+            dimension=dimension,
+            period__gte=period_start(start, granularity),
+            period__lte=end,
+        )
+        .values('key')
+        .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'key')[:limit]
+    )
@@ -0,0 +1,229 @@
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import Count, Q
+
+from .cache import product_cache
+from .models import Product
+
+# Text search configuration used by both the query and the GIN expression
+# index created in migration 0004. They must stay identical or PostgreSQL
+# will not use the index.
+SEARCH_CONFIG = 'spanish'
+
+# Field weights, mirroring PostgreSQL's default A/B/C ranking weights.
+SEARCH_FIELDS = (
+    ('name', 'A', 1.0),
+    ('brand', 'B', 0.4),
+    ('category', 'B', 0.4),
+    ('description', 'C', 0.2),
+)
+
+FACET_FIELDS = ('brand', 'category')
+
+# Lower edges of the price facet buckets; override with SEARCH_PRICE_BUCKETS.
+DEFAULT_PRICE_BUCKETS = (0, 10, 50, 100, 500, 1000)
+
+
+def product_search_vector():
+    vector = None
+    for field, weight, _ in SEARCH_FIELDS:
+        part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return TOKEN_RE.findall(text)
+
+
+class InvertedIndex:
+    """
+    In-process token -> {product_id: weight} index.
+
+    Stand-in for the PostgreSQL GIN index on backends without full-text
+    search (SQLite in tests and local development). It is rebuilt lazily
+    whenever the product cache version changes, i.e. after catalog writes.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.docs = {}
+        self.version = None
+        self._lock = threading.Lock()
+
+    def ensure_current(self, using):
+        version = product_cache.get_version()
+        if self.version == version:
+            return
+        with self._lock:
+            if self.version != version:
+                self.build(Product.objects.using(using).values_list(
+                    'id', *[field for field, _, _ in SEARCH_FIELDS], *FACET_FIELDS, 'price'
+                ).iterator(chunk_size=2000))
+                self.version = version
+
+    def build(self, rows):
+        postings = defaultdict(dict)
+        docs = {}
+        width = len(SEARCH_FIELDS)
+        for row in rows:
+            pk = row[0]
+            for (_, _, weight), value in zip(SEARCH_FIELDS, row[1:width + 1]):
+                for token in set(tokenize(value)):
+                    entry = postings[token]
+                    entry[pk] = entry.get(pk, 0.0) + weight
+            # Facet values and price, so filtering and facet counts need no
+            # per-hit database round trips.
+            docs[pk] = row[width + 1:]
+        self.postings = dict(postings)
+        self.docs = docs
+
+    def search(self, query):
+        """Return `(pk, score)` pairs matching every token, best first."""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        lists = sorted((self.postings.get(token, {}) for token in tokens), key=len)
+        candidates = set(lists[0])
+        for other in lists[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                return []
+        scored = [(pk, sum(entry[pk] for entry in lists)) for pk in candidates]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored
+
+
+    def matches(self, pk, filters):
+        doc = self.docs[pk]
+        for index, field in enumerate(FACET_FIELDS):
+            if filters.get(field) and doc[index] != filters[field]:
+                return False
+        price = doc[-1]
+        if filters.get('min_price') is not None and price < filters['min_price']:
+            return False
+        if filters.get('max_price') is not None and price > filters['max_price']:
+            return False
+        return True
+
+    def facets(self, pks):
+        counts = {field: defaultdict(int) for field in FACET_FIELDS}
+        prices = []
+        for pk in pks:
+            doc = self.docs[pk]
+            for index, field in enumerate(FACET_FIELDS):
+                counts[field][doc[index]] += 1
+            prices.append(doc[-1])
+        facets = {
+            field: [
+                {'value': value, 'count': count}
+                for value, count in sorted(values.items(), key=lambda item: (-item[1], item[0]))
+            ]
+            for field, values in counts.items()
+        }
+        facets['price'] = [
+            {'min': low, 'max': high, 'count': sum(
+                1 for price in prices if price >= low and (high is None or price < high)
+            )}
+            for low, high in get_price_ranges()
+        ]
+        return facets
+
+
+inverted_index = InvertedIndex()
+
+
+def get_price_ranges():
+    edges = tuple(getattr(settings, 'SEARCH_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS))
+    return list(zip(edges, edges[1:])) + [(edges[-1], None)]
+
+
+def parse_filters(params):
+    filters = {field: params.get(field) or None for field in FACET_FIELDS}
+    for bound in ('min_price', 'max_price'):
+        value = params.get(bound)
+        filters[bound] = Decimal(value) if value else None
+    return filters
+
+
+def apply_filters(queryset, filters):
+    for field in FACET_FIELDS:
+        if filters[field]:
+            queryset = queryset.filter(**{field: filters[field]})
+    if filters['min_price'] is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters['max_price'] is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    return queryset
+
+
+def get_facets(queryset):
+    facets = {}
+    for field in FACET_FIELDS:
+        facets[field] = [
+            {'value': row[field], 'count': row['count']}
+            for row in queryset.order_by().values(field).annotate(count=Count('id')).order_by('-count', field)
+        ]
+
+    ranges = get_price_ranges()
+    aggregates = {}
+    for index, (low, high) in enumerate(ranges):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'bucket_{index}'] = Count('id', filter=condition)
+    counts = queryset.order_by().aggregate(**aggregates)
+    facets['price'] = [
+        {'min': low, 'max': high, 'count': counts[f'bucket_{index}']}
+        for index, (low, high) in enumerate(ranges)
+    ]
+    return facets
+
+
+def search_products(query, params, limit, queryset=None):
+    """
+    Rank products against `query` and compute facets over the matches.
+
+    `params` holds the optional brand/category/min_price/max_price filters.
+    Returns `(products, total, facets)`, where `products` is a list of at most
+    `limit` instances in rank order. Uses PostgreSQL full-text search when the
+    database supports it and the in-process inverted index otherwise.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    filters = parse_filters(params)
+    query = (query or '').strip()
+
+    if query and connections[queryset.db].vendor != 'postgresql':
+        inverted_index.ensure_current(queryset.db)
+        ranked = [pk for pk, _ in inverted_index.search(query) if inverted_index.matches(pk, filters)]
+        by_pk = queryset.in_bulk(ranked[:limit])
+        products = [by_pk[pk] for pk in ranked[:limit] if pk in by_pk]
+        return products, len(ranked), inverted_index.facets(ranked)
+
+    queryset = apply_filters(queryset, filters)
+    if query:
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='plain')
+        vector = product_search_vector()
+        matched = queryset.annotate(search=vector).filter(search=search_query)
+        ordered = matched.annotate(rank=SearchRank(vector, search_query)).order_by('-rank', 'id')
+    else:
+        matched = queryset
+        ordered = queryset.order_by('-created_at', 'id')
+
+    plain = matched.prefetch_related(None)
+    return list(ordered[:limit]), plain.count(), get_facets(plain)
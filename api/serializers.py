@@ -1,20 +1,134 @@
 # serializers.py
+from decimal import Decimal
+from operator import attrgetter
 from rest_framework import serializers
-from django.core.exceptions import ValidationError as DjangoValidationError
-from .models import Product, Order, User, Cart, CartItem, ProductImage
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils.encoding import filepath_to_uri
+from .models import Product, ProductCard, Order, User, Cart, CartItem, ProductImage
+from .services import OutOfStock, add_to_cart, place_order
+
+# Fields whose to_representation is the identity for the values the model
+# field already holds (str / int / bool).
+PLAIN_FIELDS = (
+    serializers.CharField, serializers.EmailField, serializers.IntegerField,
+    serializers.BigIntegerField, serializers.BooleanField,
+)
+SKIP = object()
+
+
+class LeanListSerializer(serializers.ListSerializer):
+    """
+    Read path for lists: per-field getters are worked out once per response
+    instead of running `get_attribute` + `to_representation` for every field
+    of every row. Plain model values are copied as they are, decimals that
+    already have the field's scale are formatted directly, and anything else
+    (or any row where a shortcut does not apply) takes the regular DRF path,
+    so the output is identical to `ListSerializer`'s.
+
+    Opt in with `Meta.list_serializer_class`; nested lists are only made lean
+    when their own serializer opts in.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        row = lean_row(self.child)
+        return [row(item) for item in iterable]
+
+
+def lean_row(serializer):
+    """`instance -> dict` equivalent to `serializer.to_representation`."""
+    getters = [(field.field_name, lean_getter(field)) for field in serializer._readable_fields]
+
+    def row(instance):
+        ret = {}
+        for name, getter in getters:
+            value = getter(instance)
+            if value is not SKIP:
+                ret[name] = value
+        return ret
+    return row
+
+
+def lean_getter(field):
+    def regular(instance):
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return SKIP
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else field.to_representation(attribute)
+
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(field.parent, field.method_name)
+    if not field.source_attrs or field.source == '*':
+        return regular
+    source = attrgetter('.'.join(field.source_attrs))
+
+    if isinstance(field, LeanListSerializer):
+        child = lean_row(field.child)
+
+        def nested(instance):
+            try:
+                value = source(instance)
+            except (AttributeError, ObjectDoesNotExist):
+                return regular(instance)
+            if isinstance(value, models.manager.BaseManager):
+                value = value.all()
+            return None if value is None else [child(item) for item in value]
+        return nested
+
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.use_pk_only_optimization() and len(field.source_attrs) == 1:
+        name = field.source_attrs[0]
+        return lambda instance: instance.serializable_value(name)
+
+    if type(field) in PLAIN_FIELDS:
+        def plain(instance):
+            try:
+                value = source(instance)
+            except (AttributeError, ObjectDoesNotExist):
+                return regular(instance)
+            # Callable sources (methods, `get_FOO_display`) are called by DRF.
+            return regular(instance) if callable(value) else value
+        return plain
+
+    if (type(field) is serializers.DecimalField
+            and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+            and not field.localize and not field.normalize_output):
+        exponent = -field.decimal_places
+
+        def decimal(instance):
+            try:
+                value = source(instance)
+            except (AttributeError, ObjectDoesNotExist):
+                return regular(instance)
+            if type(value) is Decimal and value.as_tuple().exponent == exponent:
+                return f'{value:f}'
+            return regular(instance)
+        return decimal
+
+    return regular
+
 
 class ProductImageSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'product','is_main']
+        fields = ['id', 'image', 'product','is_main', 'width', 'height', 'srcset']
+        list_serializer_class = LeanListSerializer
+        read_only_fields = ['width', 'height']
 
     def get_image(self, obj):
-        if not obj.image:
+        name = obj.image.name
+        if not name:
             return None
         
-        name = str(obj.image.name)
         # Handle cases where Django prepends 'products/' to the URL
         if "http://" in name or "https://" in name:
             idx = name.find("http")
@@ -24,13 +138,43 @@ class ProductImageSerializer(serializers.ModelSerializer):
             return name
         
         try:
-            url = obj.image.url
-            request = self.context.get('request')
-            if request is not None and not url.startswith('http'):
-                return request.build_absolute_uri(url)
-            return url
+            return self.get_storage_url(obj.image.storage, name)
         except (ValueError, AttributeError):
             return None
+
+    def get_srcset(self, obj):
+        """`srcset` over the processed WebP variants; empty until processed."""
+        if not obj.variants:
+            return ""
+        storage = obj.image.storage
+        return ", ".join(
+            f"{self.get_storage_url(storage, name)} {width}w"
+            for width, name in sorted(obj.variants.items(), key=lambda item: int(item[0]))
+        )
+
+    def get_storage_url(self, storage, name):
+        """Absolute URL of the file `name` in `storage`."""
+        if isinstance(storage, FileSystemStorage):
+            # Same result as storage.url() + build_absolute_uri(), but the
+            # absolute base is resolved once per response instead of per file.
+            return self.get_media_base(storage) + filepath_to_uri(name).lstrip('/')
+        url = storage.url(name)
+        request = self.context.get('request')
+        if request is not None and not url.startswith('http'):
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_media_base(self, storage):
+        # The context dict is shared with the parent serializer, so nested
+        # image lists reuse the same value for the whole response.
+        base = self.context.get('media_base')
+        if base is None:
+            base = storage.base_url
+            request = self.context.get('request')
+            if request is not None and not base.startswith('http'):
+                base = request.build_absolute_uri(base)
+            self.context['media_base'] = base
+        return base
         
         
 class ProductSerializer(serializers.ModelSerializer):
@@ -39,31 +183,23 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'code', 'name', 'description', 'price', 'quantity', 'images', 'brand', 'category']
+        list_serializer_class = LeanListSerializer
         read_only_fields = ['created_at', 'updated_at']
 
     def create(self, validated_data):
         request= self.context.get('request')
         images_data = request.FILES.getlist('images')
         
-        # Debug logging
-        print("=== DEBUG CREATE PRODUCT ===")
-        print(f"FILES keys: {list(request.FILES.keys())}")
-        print(f"FILES: {request.FILES}")
-        print(f"images_data from 'images': {images_data}")
-        
         # Also check for 'image' (singular) as fallback
         if not images_data:
             single_image = request.FILES.get('image')
             if single_image:
                 images_data = [single_image]
-                print(f"Found single image: {single_image}")
         
         product = Product.objects.create(**validated_data)
         for index,image_file in enumerate(images_data):
-            print(f"Creating ProductImage for: {image_file}")
             ProductImage.objects.create(product=product, image=image_file, is_main=index==0)
         
-        print(f"Total images created: {len(images_data)}")
         return product
         
 
@@ -80,6 +216,48 @@ class ProductSerializer(serializers.ModelSerializer):
                 ProductImage.objects.create(product=instance, image=image_file)
         return instance
         
+class ProductCardSerializer(serializers.ModelSerializer):
+    """Catalog card read straight from ProductCard; `id` is the product's."""
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductCard
+        fields = ['id', 'name', 'brand', 'price', 'in_stock', 'image']
+        list_serializer_class = LeanListSerializer
+
+    def get_image(self, obj):
+        url = obj.image
+        if not url:
+            return None
+        if url.startswith('/'):
+            return self.get_host() + url
+        return url
+
+    def get_host(self):
+        # Resolved once per response, like ProductImageSerializer.get_media_base.
+        host = self.context.get('host')
+        if host is None:
+            request = self.context.get('request')
+            host = request.build_absolute_uri('/')[:-1] if request is not None else ''
+            self.context['host'] = host
+        return host
+
+
+class ProductRowSerializer(serializers.ModelSerializer):
+    """Validates one row of a bulk import; uniqueness is left to the upsert."""
+
+    class Meta:
+        model = Product
+        fields = ['code', 'name', 'brand', 'price', 'quantity', 'description', 'category']
+        extra_kwargs = {'code': {'validators': []}}
+
+    def validate_quantity(self, value):
+        if value < 0:
+            raise serializers.ValidationError("La cantidad no puede ser negativa")
+        return value
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -117,22 +295,15 @@ class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['id', 'cart', 'product', 'product_name', 'quantity', 'subtotal','price']
+        list_serializer_class = LeanListSerializer
         read_only_fields = ['subtotal','price']
         
     def create(self, validated_data):
-        cart=validated_data.get('cart')
-        product=validated_data.get('product')
-        quantity=validated_data.get('quantity')
-        
         try:
-            cart_item, created=CartItem.objects.get_or_create(cart=cart, product=product, defaults={'quantity': quantity})
-            if not created:
-                cart_item.quantity += quantity
-            cart_item.full_clean()
-            cart_item.save()
-            return cart_item
-        except DjangoValidationError as e:
-            raise serializers.ValidationError(getattr(e,'message_dict', e.messages))
+            cart_item, _ = add_to_cart(validated_data['cart'], validated_data['product'].pk, validated_data['quantity'])
+        except OutOfStock as e:
+            raise serializers.ValidationError({"quantity": str(e)})
+        return cart_item
     
     def validate_quantity(self,value):
         if value<1:
@@ -140,9 +311,24 @@ class CartItemSerializer(serializers.ModelSerializer):
         return value
     
     
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'])
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, data):
+        if data['op'] != 'remove' and 'quantity' not in data:
+            raise serializers.ValidationError({"quantity": "La cantidad es requerida para add y set."})
+        return data
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=500)
+
+
 class CartSerializer(serializers.ModelSerializer):
-    items=CartItemSerializer(many=True, read_only=True)
-    total_items=serializers.IntegerField(source='items.count', read_only=True)
+    items=CartItemSerializer(source='cartitem_set', many=True, read_only=True)
+    total_items=serializers.IntegerField(read_only=True)
     total_price=serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     
     class Meta:
@@ -157,7 +343,11 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'product', 'product_name', 'quantity', 'total', 'created_at', 'updated_at']
+        list_serializer_class = LeanListSerializer
         read_only_fields = ['total', 'created_at', 'updated_at']
         
     def create(self, validated_data):
-        return super().create(validated_data)
\ No newline at end of file
+        try:
+            return place_order(validated_data['product'], validated_data['quantity'])
+        except (OutOfStock, ValueError) as e:
+            raise serializers.ValidationError({"quantity": str(e)})
\ No newline at end of file
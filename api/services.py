@@ -0,0 +1,267 @@
+from django.db import connections, router, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .cache import product_cache
+from .cards import sync_card_stock
+from .models import CartItem, Order, Product
+from .rollups import record_orders
+
+
+class EmptyCart(Exception):
+    """Raised when checking out a cart with no items."""
+
+
+class CartChanged(Exception):
+    """Raised when a cart's lines change while it is being checked out."""
+
+
+class OutOfStock(Exception):
+    """Raised when a product cannot cover the requested quantity."""
+
+    def __init__(self, product_id, requested, available):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"No hay suficiente stock para el producto {product_id}: "
+            f"solicitado {requested}, disponible {available}"
+        )
+
+
+def reserve_stock(product_id, quantity):
+    """
+    Decrement stock with a single conditional UPDATE.
+
+    `UPDATE ... SET quantity = quantity - n WHERE id = ? AND quantity >= n`
+    is atomic on every backend, so concurrent buyers can never take the
+    quantity below zero and no row lock is held between read and write.
+    Raises OutOfStock (or Product.DoesNotExist) when no row is updated.
+    """
+    if quantity < 1:
+        raise ValueError("La cantidad debe ser al menos 1")
+    updated = Product.objects.filter(pk=product_id, quantity__gte=quantity).update(
+        quantity=F('quantity') - quantity,
+        # update() bypasses auto_now and post_save.
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        available = Product.objects.filter(pk=product_id).values_list('quantity', flat=True).first()
+        if available is None:
+            raise Product.DoesNotExist(f"Producto {product_id} no encontrado")
+        raise OutOfStock(product_id, quantity, available)
+    sync_card_stock([product_id])
+    # Stock moves on every sale: one catalog rebuild per COALESCE_SECONDS.
+    product_cache.invalidate_soon()
+
+
+def reserve_stock_bulk(quantities):
+    """
+    Reserve stock for several products with one UPDATE, whatever their number.
+
+    `quantities` maps product id to units. The statement only touches rows
+    that can cover their quantity. If any row was skipped, the UPDATE is
+    rolled back to a savepoint and OutOfStock is raised for the first short
+    product. Must be called inside transaction.atomic().
+    """
+    if not quantities:
+        return
+    enough = Q()
+    for product_id, quantity in quantities.items():
+        if quantity < 1:
+            raise ValueError("La cantidad debe ser al menos 1")
+        enough |= Q(pk=product_id, quantity__gte=quantity)
+
+    savepoint = transaction.savepoint()
+    updated = Product.objects.filter(enough).update(
+        quantity=F('quantity') - Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+            output_field=IntegerField(),
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated == len(quantities):
+        transaction.savepoint_commit(savepoint)
+        sync_card_stock(quantities)
+        product_cache.invalidate_soon()
+        return
+
+    transaction.savepoint_rollback(savepoint)
+    available = dict(Product.objects.filter(pk__in=list(quantities)).values_list('pk', 'quantity'))
+    short = [pk for pk, quantity in quantities.items() if available.get(pk, 0) < quantity]
+    # Without a short product another writer got in between; report the first line.
+    product_id = short[0] if short else next(iter(quantities))
+    raise OutOfStock(product_id, quantities[product_id], available.get(product_id, 0))
+
+
+def _add_to_cart_sql(connection):
+    qn = connection.ops.quote_name
+    item = qn(CartItem._meta.db_table)
+    product = qn(Product._meta.db_table)
+    # New lines copy the product's price; existing ones keep theirs. Both
+    # branches only write when the product covers the resulting quantity.
+    return (
+        f"INSERT INTO {item} (cart_id, product_id, quantity, current_price, created_at, updated_at) "
+        f"SELECT %s, p.id, %s, p.price, %s, %s FROM {product} p "
+        f"WHERE p.id = %s AND p.quantity >= %s "
+        f"ON CONFLICT (cart_id, product_id) DO UPDATE SET "
+        f"quantity = {item}.quantity + excluded.quantity, updated_at = excluded.updated_at "
+        f"WHERE {item}.quantity + excluded.quantity <= "
+        f"(SELECT p.quantity FROM {product} p WHERE p.id = excluded.product_id) "
+        f"RETURNING id, CASE WHEN created_at = updated_at THEN 1 ELSE 0 END"
+    )
+
+
+def add_to_cart(cart, product_id, quantity):
+    """
+    Add `quantity` units of a product to `cart` in one statement:
+    INSERT ... SELECT FROM product ... ON CONFLICT (cart, product) DO UPDATE
+    SET quantity = quantity + n. The stock check is part of the statement,
+    so concurrent adds can neither lose increments, nor create a second
+    line, nor push the line past the stock.
+
+    Returns `(item, created)` with the item's product loaded. Raises
+    OutOfStock when the resulting quantity exceeds the stock and
+    Product.DoesNotExist for an unknown product.
+    """
+    if quantity < 1:
+        raise ValueError("La cantidad debe ser al menos 1")
+    try:
+        product_id = int(product_id)
+    except (TypeError, ValueError):
+        raise Product.DoesNotExist(f"Producto {product_id} no encontrado")
+    using = router.db_for_write(CartItem)
+    connection = connections[using]
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    # Atomic so that the line read back is the one just written.
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute(_add_to_cart_sql(connection), [cart.pk, quantity, now, now, product_id, quantity])
+            row = cursor.fetchone()
+        if row is not None:
+            item = CartItem.objects.using(using).select_related('product').get(pk=row[0])
+            return item, bool(row[1])
+    available = Product.objects.using(using).filter(pk=product_id).values_list('quantity', flat=True).first()
+    if available is None:
+        raise Product.DoesNotExist(f"Producto {product_id} no encontrado")
+    current = CartItem.objects.using(using).filter(cart=cart, product_id=product_id).values_list(
+        'quantity', flat=True).first() or 0
+    raise OutOfStock(product_id, current + quantity, available)
+
+
+def apply_cart_operations(cart, operations):
+    """
+    Apply a list of cart operations in one transaction. Each operation is a
+    dict with `op` ("add", "set" or "remove"), `product` (an id) and, except
+    for removals, `quantity`. They are folded in order into the final
+    quantity of each line, and then written with a fixed number of
+    statements, whatever their number:
+    - one in_bulk read of the products,
+    - one INSERT of empty lines for products not yet in the cart,
+    - one locking read of the lines they touch,
+    - one bulk upsert of the new and changed lines,
+    - one DELETE of the removed lines.
+
+    All or nothing: raises Product.DoesNotExist for an unknown product and
+    OutOfStock for a line ending above its product's stock.
+    """
+    with transaction.atomic():
+        needed = {operation['product'] for operation in operations if operation['op'] != 'remove'}
+        products = Product.objects.only('id', 'price', 'quantity').in_bulk(needed)
+        missing = needed - products.keys()
+        if missing:
+            raise Product.DoesNotExist(f"Producto {min(missing)} no encontrado")
+
+        # Every line being added to or set exists before the lines are read
+        # and locked, so a concurrent add_to_cart either commits first and is
+        # read, or waits for this transaction and adds on top of its result.
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=products[product_id], quantity=0, current_price=products[product_id].price)
+            for product_id in sorted(needed)
+        ], ignore_conflicts=True)
+        lines = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(
+                cart=cart, product_id__in={operation['product'] for operation in operations},
+            )
+        }
+        quantities = {product_id: item.quantity for product_id, item in lines.items()}
+        for operation in operations:
+            product_id = operation['product']
+            if operation['op'] == 'remove':
+                quantities[product_id] = 0
+            elif operation['op'] == 'set':
+                quantities[product_id] = operation['quantity']
+            else:
+                quantities[product_id] = quantities.get(product_id, 0) + operation['quantity']
+
+        upserts, removed = [], []
+        for product_id, quantity in quantities.items():
+            line = lines.get(product_id)
+            if not quantity:
+                if line is not None:
+                    removed.append(line.pk)
+                continue
+            product = products[product_id]
+            if quantity > product.quantity:
+                raise OutOfStock(product_id, quantity, product.quantity)
+            if line is None or line.quantity != quantity:
+                upserts.append(CartItem(cart=cart, product=product, quantity=quantity, current_price=product.price))
+
+        if upserts:
+            # Existing lines keep the price they were added at.
+            CartItem.objects.bulk_create(
+                upserts, update_conflicts=True, unique_fields=['cart', 'product'],
+                update_fields=['quantity', 'updated_at'],
+            )
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+
+
+def place_order(product, quantity):
+    """Reserve stock and create the order in one transaction."""
+    with transaction.atomic():
+        reserve_stock(product.pk, quantity)
+        return Order.objects.create(product=product, quantity=quantity)
+
+
+def checkout_cart(user):
+    """
+    Turn every line in the user's carts into an order.
+
+    Runs a fixed number of statements regardless of cart size: read the
+    lines, one stock UPDATE, one bulk INSERT of orders, one rollup upsert
+    and one DELETE of the lines, all in a single transaction. Returns `(orders, total_items,
+    total_price)`.
+
+    The lines are locked while they are read, so a second checkout of the
+    same cart waits and then finds it empty. Raises CartChanged, rolling
+    everything back, if the lines deleted are not the lines ordered.
+    """
+    with transaction.atomic():
+        items = list(
+            CartItem.objects.select_for_update(of=('self',)).filter(cart__user=user)
+            .select_related('product').order_by('id')
+        )
+        if not items:
+            raise EmptyCart("El carrito está vacío.")
+
+        quantities = {}
+        for item in items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        reserve_stock_bulk(quantities)
+
+        # bulk_create skips Order.save(), so the total is set here the same way.
+        orders = Order.objects.bulk_create([
+            Order(product=item.product, quantity=item.quantity, total=item.product.price * item.quantity)
+            for item in items
+        ])
+        # bulk_create does not send post_save either.
+        record_orders(orders)
+        _, deleted = CartItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+        if deleted.get(CartItem._meta.label, 0) != len(items):
+            raise CartChanged("El carrito cambió durante la compra, inténtelo de nuevo.")
+
+    total_items = sum(order.quantity for order in orders)
+    total_price = sum((order.total for order in orders), 0)
+    return orders, total_items, total_price
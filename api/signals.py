@@ -0,0 +1,86 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import forget_user_state
+from .cache import product_cache
+from .cards import sync_card_images, sync_cards
+from .counts import adjust_cached_count
+from .images import processor
+from .metrics import instrument_connection
+from .models import CartItem, Order, Product, ProductImage, User
+from .rollups import record_orders
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_cache(sender, **kwargs):
+    product_cache.invalidate_on_commit()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, raw=False, **kwargs):
+    # Images are part of the product representation, so they move its
+    # updated_at (and with it the ETag/Last-Modified validators).
+    if not raw:
+        Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Product)
+def sync_product_card(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_cards([instance])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def sync_product_card_image(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Runs after touch_product, so the card picks up the new updated_at.
+    # The image processor only fills in sizes and variants.
+    if raw or (update_fields and not {'image', 'is_main', 'product'} & set(update_fields)):
+        return
+    sync_card_images([instance.product_id])
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, raw=False, **kwargs):
+    # Orders created with bulk_create (checkout) are recorded by the caller.
+    if created and not raw:
+        record_orders([instance])
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=CartItem)
+def count_created_row(sender, instance, created, using, raw=False, **kwargs):
+    if created and not raw:
+        adjust_cached_count(sender, using, 1)
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=CartItem)
+def count_deleted_row(sender, instance, using, **kwargs):
+    adjust_cached_count(sender, using, -1)
+
+
+@receiver(post_save, sender=ProductImage)
+def process_uploaded_image(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        processor.enqueue(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_auth_state(sender, instance, **kwargs):
+    # Role, activation or token version may have changed.
+    forget_user_state(instance.pk)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument_connection(connection)
@@ -0,0 +1,110 @@
+"""
+Unpaginated streaming mode for list endpoints.
+
+`GET <list>?stream=ndjson` (one JSON object per line) or `?stream=json`
+(a single JSON array) returns the whole filtered result as a streaming
+response. Rows are read with `.iterator()` and serialized and rendered a
+batch at a time as the client consumes them, so memory stays flat whatever
+the size of the result and the first rows go out before the last are read.
+
+Under ASGI, Django collects a sync iterator into a list before sending it,
+so there the chunks are handed over through an async iterator instead
+(`streaming_response`).
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.response import Response
+
+from .permissions import IsAdminOrStaff
+from .renderers import FastJSONRenderer
+
+STREAM_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def stream_rows(queryset, serialize, fmt, chunk_size=500):
+    """
+    Yield encoded chunks of `serialize(rows)` (a list of dicts) for every
+    `chunk_size` rows of `queryset`.
+    """
+    renderer = FastJSONRenderer()
+    rows = queryset.iterator(chunk_size=chunk_size)
+    if fmt == 'json':
+        yield b'['
+    first = True
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield _encode(renderer, serialize(batch), fmt, first)
+            first = False
+            batch = []
+    if batch:
+        yield _encode(renderer, serialize(batch), fmt, first)
+    if fmt == 'json':
+        yield b']'
+
+
+def _encode(renderer, data, fmt, first):
+    if fmt == 'ndjson':
+        return b''.join(renderer.render(item) + b'\n' for item in data)
+    # Render the batch as one array and drop its brackets.
+    body = renderer.render(data)[1:-1]
+    return body if first else b',' + body
+
+
+async def aiter_chunks(chunks):
+    """
+    Pull a sync chunk generator one chunk at a time from async code. Every
+    step runs on the same thread, so the generator keeps its database
+    connection and cursor.
+    """
+    chunks = iter(chunks)
+    step = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await step(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def streaming_response(request, chunks, content_type):
+    """A StreamingHttpResponse for `chunks` that streams under WSGI and ASGI."""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = aiter_chunks(chunks)
+    return StreamingHttpResponse(chunks, content_type=content_type)
+
+
+class StreamingListMixin:
+    """
+    ViewSet mixin adding `?stream=ndjson|json` to `list`. Filters apply;
+    pagination does not. Put it before CachedReadMixin, since streamed
+    bodies are not cached.
+
+    A stream walks the whole table, so it is for the roles in
+    `stream_permission_classes` (admin and staff) on top of the view's own.
+    """
+    stream_chunk_size = 500
+    stream_permission_classes = [IsAdminOrStaff]
+
+    def list(self, request, *args, **kwargs):
+        fmt = request.query_params.get('stream')
+        if fmt is None:
+            return super().list(request, *args, **kwargs)
+        for permission in self.stream_permission_classes:
+            if not permission().has_permission(request, self):
+                self.permission_denied(request, message="Solo administradores y staff pueden usar stream.")
+        if fmt not in STREAM_CONTENT_TYPES:
+            return Response({"detail": "Formato inválido. Use ndjson o json."}, status=400)
+        queryset = self.filter_queryset(self.get_queryset())
+        # Rows are read after the view returns: bind the database now.
+        queryset = queryset.using(queryset.db)
+        return streaming_response(
+            request,
+            stream_rows(queryset, lambda rows: self.get_serializer(rows, many=True).data,
+                        fmt, self.stream_chunk_size),
+            STREAM_CONTENT_TYPES[fmt],
+        )
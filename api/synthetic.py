@@ -0,0 +1,117 @@
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+
+from . import cards
+from .cache import product_cache
+from .models import Cart, CartItem, Order, Product, ProductImage, User
+from .rollups import rebuild
+
+BRANDS = (
+    'Samsung', 'Apple', 'Xiaomi', 'Sony', 'LG', 'Lenovo', 'HP', 'Dell', 'Asus',
+    'Nike', 'Adidas', 'Puma', 'Philips', 'Oster', 'Mabe', 'Whirlpool',
+)
+CATEGORIES = (
+    'Celulares', 'Computación', 'Electrodomésticos', 'Televisores', 'Audio',
+    'Deportes', 'Calzado', 'Ropa', 'Hogar', 'Juguetes', 'Herramientas',
+)
+WORDS = (
+    'teléfono', 'portátil', 'audífonos', 'nevera', 'lavadora', 'zapatos',
+    'camisa', 'licuadora', 'cafetera', 'monitor', 'teclado', 'ratón', 'parlante',
+    'bicicleta', 'pelota', 'taladro', 'cocina', 'televisor', 'cargador', 'reloj',
+    'inalámbrico', 'negro', 'blanco', 'azul', 'rojo', 'pro', 'max', 'mini',
+    'ultra', 'lite', 'plus', 'deportivo', 'inteligente', 'digital', 'acero',
+)
+
+
+def product_rows(count, seed=0, start=0):
+    """Yield deterministic, unsaved Product instances."""
+    rng = random.Random(seed)
+    for i in range(start, start + count):
+        words = rng.sample(WORDS, 3)
+        yield Product(
+            code=f"S{i:09d}",
+            name=' '.join(words).capitalize()[:50],
+            brand=rng.choice(BRANDS),
+            category=rng.choice(CATEGORIES),
+            price=Decimal(rng.randint(100, 200000)) / 100,
+            quantity=rng.randint(0, 500),
+            description=' '.join(rng.choice(WORDS) for _ in range(12)),
+        )
+
+
+def generate_products(count, batch_size=5000, seed=0, using='default'):
+    """
+    Bulk insert `count` synthetic products. bulk_create bypasses post_save,
+    so the product cache is invalidated once at the end; catalog cards are
+    left to the caller (see api.cards.rebuild).
+    """
+    batch = []
+    for product in product_rows(count, seed=seed):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            Product.objects.using(using).bulk_create(batch)
+            batch = []
+    if batch:
+        Product.objects.using(using).bulk_create(batch)
+    product_cache.invalidate()
+
+
+def _bulk_create(model, rows, batch_size, using):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            model.objects.using(using).bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.using(using).bulk_create(batch)
+
+
+def generate_dataset(products, users=100, carts=50, orders=1000, images_per_product=2,
+                     items_per_cart=5, password='bench', batch_size=5000, seed=0, using='default'):
+    """
+    Seed a deterministic catalog plus users, product images, carts and orders.
+
+    Users are CUSTOMERs sharing one password (hashed once). Images point at
+    remote URLs so the image processor skips them, and orders are bulk
+    inserted with their totals precomputed, so the dashboard rollups (and
+    the catalog cards) are rebuilt once at the end. Returns the created users in id order.
+    """
+    rng = random.Random(seed)
+    generate_products(products, batch_size=batch_size, seed=seed, using=using)
+    catalog = list(Product.objects.using(using).order_by('id').values_list('id', 'price'))
+
+    hashed = make_password(password)
+    _bulk_create(User, (
+        User(username=f'bench-user-{i}', email=f'bench{i}@example.com', password=hashed, role='CUSTOMER')
+        for i in range(users)
+    ), batch_size, using)
+    people = list(User.objects.using(using).filter(username__startswith='bench-user-').order_by('id'))
+
+    _bulk_create(ProductImage, (
+        ProductImage(
+            product_id=product_id, is_main=position == 0, status='READY',
+            image=f'https://cdn.example.com/products/{product_id}-{position}.jpg',
+        )
+        for product_id, _ in catalog for position in range(images_per_product)
+    ), batch_size, using)
+
+    _bulk_create(Cart, (Cart(user=person) for person in people[:carts]), batch_size, using)
+    cart_ids = list(Cart.objects.using(using).order_by('id').values_list('id', flat=True))
+    _bulk_create(CartItem, (
+        CartItem(cart_id=cart_id, product_id=product_id, quantity=rng.randint(1, 3), current_price=price)
+        for cart_id in cart_ids
+        for product_id, price in rng.sample(catalog, min(items_per_cart, len(catalog)))
+    ), batch_size, using)
+
+    def order_rows():
+        for _ in range(orders):
+            product_id, price = rng.choice(catalog)
+            quantity = rng.randint(1, 5)
+            yield Order(product_id=product_id, quantity=quantity, total=price * quantity)
+    _bulk_create(Order, order_rows(), batch_size, using)
+    rebuild()
+    cards.rebuild(using)
+    return people
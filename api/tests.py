@@ -1,3 +1,1629 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import UserRefreshToken
+from .benchmarks import compare, route_names
+from .cache import LocalLRU, ResponseCache, product_cache
+from .compression import choose_encoding
+from .counts import count_rows, estimated_count
+from .images import process_image, processor
+from .metrics import recording, reset as reset_metrics
+from .management.commands.bench_api import SCENARIOS
+from .models import Cart, CartItem, Order, Product, ProductCard, ProductImage, SalesRollup, User
+from .queryplans import full_scans, prefer_indexes
+from .querysets import get_fetch_plan
+from .ratelimit import CacheTokenBucket, LocalTokenBucket, LoginRateLimiter
+from .replicas import ReplicaRouter, choose_replica, release, route_reads
+from .renderers import FastJSONParser, FastJSONRenderer
+from .services import (
+    EmptyCart, OutOfStock, add_to_cart, apply_cart_operations, checkout_cart, place_order, reserve_stock,
+)
+from .serializers import (
+    CartItemSerializer, LeanListSerializer, OrderSerializer, ProductImageSerializer, ProductSerializer,
+)
+from .synthetic import generate_dataset
+from .views import ProductViewSet
+
+
+def make_products(count, prefix='P', **extra):
+    products = []
+    for i in range(count):
+        products.append(Product.objects.create(
+            code=f"{prefix}{i:05d}",
+            name=f"Producto {i}",
+            brand=extra.get('brand', 'Marca'),
+            price=extra.get('price', Decimal('10.00')),
+            quantity=extra.get('quantity', 10),
+            category=extra.get('category', 'General'),
+        ))
+    return products
+
+
+def make_user(username, role='CUSTOMER'):
+    return User.objects.create_user(
+        username=username, email=f"{username}@example.com", password='secret123', role=role,
+    )
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        product_cache.clear()
+        self.client = APIClient()
+        self.products = make_products(7)
+        # Force ties on created_at so the id tiebreaker is exercised.
+        same_time = timezone.now()
+        Product.objects.filter(pk__in=[p.pk for p in self.products[2:5]]).update(created_at=same_time)
+
+    def expected_order(self):
+        return list(Product.objects.order_by('-created_at', 'id').values_list('id', flat=True))
+
+    def test_walks_forward_and_back_without_gaps(self):
+        url = '/api/products/?page_size=3'
+        seen = []
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            seen.extend(item['id'] for item in response.json()['results'])
+            url = response.json()['next']
+        self.assertEqual(seen, self.expected_order())
+        self.assertIsNone(pages[0]['previous'])
+
+        back = []
+        url = pages[-1]['previous']
+        while url:
+            response = self.client.get(url)
+            back = [item['id'] for item in response.json()['results']] + back
+            url = response.json()['previous']
+        self.assertEqual(back, self.expected_order()[:len(back)])
+        self.assertEqual(len(back), 6)
+
+    def test_page_size_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=2):
+            response = self.client.get('/api/products/?page_size=50')
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get('/api/products/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductListQueryCountTests(TestCase):
+    def setUp(self):
+        product_cache.clear()
+        self.client = APIClient()
+
+    def add_products(self, count, prefix):
+        for product in make_products(count, prefix=prefix):
+            ProductImage.objects.create(product=product, image='products/a.jpg', is_main=True)
+            ProductImage.objects.create(product=product, image='products/b.jpg')
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        # Validators, the page and its images.
+        self.add_products(2, 'A')
+        with self.assertNumQueries(3):
+            small = self.client.get('/api/products/')
+        self.add_products(15, 'B')
+        with self.assertNumQueries(3):
+            large = self.client.get('/api/products/')
+        self.assertEqual(len(small.json()['results']), 2)
+        self.assertEqual(len(large.json()['results']), 17)
+        self.assertEqual(
+            large.json()['results'][0]['images'][0]['image'],
+            'http://testserver/media/products/a.jpg',
+        )
+
+    def test_fetch_plan_is_derived_from_serializer(self):
+        select, prefetch = get_fetch_plan(Product, ProductSerializer)
+        self.assertEqual(select, ())
+        self.assertEqual(prefetch, (('images', ProductImage, ProductImageSerializer),))
+        self.assertEqual(get_fetch_plan(CartItem, CartItemSerializer)[0], ('product',))
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = make_user('admin', role='ADMIN')
+        self.client.force_authenticate(self.admin)
+        self.products = make_products(3, price=Decimal('2.50'))
+
+    def add_carts(self, count):
+        for i in range(count):
+            cart = Cart.objects.create(user=make_user(f"buyer{Cart.objects.count()}"))
+            for quantity, product in enumerate(self.products, start=1):
+                CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+
+    def test_totals_are_annotated(self):
+        self.add_carts(1)
+        cart = Cart.objects.with_totals().get()
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.total_items, 6)
+            self.assertEqual(cart.total_price, Decimal('15.00'))
+        plain = Cart.objects.get()
+        self.assertEqual(plain.total_price, Decimal('15.00'))
+
+    def test_admin_list_query_count_is_fixed(self):
+        self.add_carts(2)
+        with self.assertNumQueries(2):
+            self.client.get('/api/carts/')
+        self.add_carts(5)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/carts/')
+        self.assertEqual(len(response.data), 7)
+        cart = response.data[0]
+        self.assertEqual(cart['total_items'], 6)
+        self.assertEqual(cart['total_price'], '15.00')
+        self.assertEqual([item['product_name'] for item in cart['items']],
+                         [p.name for p in self.products])
+
+
+class ProductCacheTests(TestCase):
+    def setUp(self):
+        product_cache.clear()
+        self.client = APIClient()
+        self.product = make_products(1)[0]
+
+    def test_second_read_is_served_from_cache(self):
+        first = self.client.get(f'/api/products/{self.product.pk}/')
+        with self.assertNumQueries(0):
+            second = self.client.get(f'/api/products/{self.product.pk}/')
+        self.assertEqual(first.json(), second.json())
+        self.assertIsInstance(product_cache.local.get(
+            product_cache.make_key('retrieve', f'http://testserver/api/products/{self.product.pk}/')
+        ), bytes)
+
+    def test_stock_changes_share_one_invalidation(self):
+        responses = ResponseCache('coalesce-test', {'COALESCE_SECONDS': 60, 'VERSION_TTL': 0})
+        version = responses.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                responses.invalidate_soon()
+        self.assertEqual(responses.get_version(), version)
+        with mock.patch('api.cache.time.time', return_value=time.time() + 61):
+            self.assertEqual(responses.get_version(), version + 1)
+        self.assertEqual(responses.get_version(), version + 1)
+
+    def test_writes_invalidate_cached_responses(self):
+        self.client.get('/api/products/')
+        self.product.name = 'Renombrado'
+        self.product.save()
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.json()['results'][0]['name'], 'Renombrado')
+
+        ProductImage.objects.create(product=self.product, image='products/x.jpg')
+        response = self.client.get('/api/products/')
+        self.assertEqual(len(response.json()['results'][0]['images']), 1)
+
+        self.product.delete()
+        self.assertEqual(self.client.get('/api/products/').json()['results'], [])
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get('/api/products/999/').status_code, 404)
+        self.assertEqual(len(product_cache.local), 0)
+
+    def test_local_tier_is_bounded(self):
+        lru = LocalLRU(2)
+        lru.set('a', b'1')
+        lru.set('b', b'2')
+        lru.get('a')
+        lru.set('c', b'3')
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), b'1')
+
+    def test_concurrent_misses_run_producer_once(self):
+        cache = ResponseCache('stampede')
+        cache.clear()
+        key = cache.make_key('list', 'x')
+        calls = []
+
+        def producer():
+            calls.append(1)
+            time.sleep(0.1)
+            return b'body'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_set(key, producer)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [b'body'] * 8)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        product_cache.clear()
+        self.client = APIClient()
+        rows = [
+            ('S1', 'Teléfono Galaxy', 'Samsung', 'Celulares', '300.00', 'Pantalla grande'),
+            ('S2', 'Funda', 'Genérica', 'Accesorios', '5.00', 'Funda para telefono Samsung'),
+            ('S3', 'Televisor', 'Samsung', 'Televisores', '800.00', 'Smart TV'),
+            ('S4', 'iPhone', 'Apple', 'Celulares', '900.00', 'Teléfono inteligente'),
+        ]
+        for code, name, brand, category, price, description in rows:
+            Product.objects.create(code=code, name=name, brand=brand, category=category,
+                                   price=Decimal(price), quantity=1, description=description)
+
+    def search(self, query_string):
+        response = self.client.get('/api/products/search/?' + query_string)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranks_name_matches_first(self):
+        data = self.search('q=telefono')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['results'][0]['code'], 'S1')
+        self.assertEqual({item['code'] for item in data['results']}, {'S1', 'S2', 'S4'})
+
+    def test_returns_facets_for_matches(self):
+        data = self.search('q=telefono')
+        self.assertEqual(data['facets']['category'][0], {'value': 'Celulares', 'count': 2})
+        buckets = {bucket['min']: bucket['count'] for bucket in data['facets']['price']}
+        self.assertEqual(buckets[0], 1)
+        self.assertEqual(buckets[100], 1)
+        self.assertEqual(buckets[500], 1)
+
+    def test_filters_narrow_results_and_facets(self):
+        data = self.search('q=samsung&category=Celulares&max_price=500')
+        self.assertEqual([item['code'] for item in data['results']], ['S1'])
+        self.assertEqual(data['facets']['brand'], [{'value': 'Samsung', 'count': 1}])
+
+    def test_index_follows_catalog_writes(self):
+        self.assertEqual(self.search('q=tablet')['count'], 0)
+        Product.objects.create(code='S5', name='Tablet', brand='Lenovo', category='Computación',
+                               price=Decimal('150.00'), quantity=1)
+        self.assertEqual(self.search('q=tablet')['count'], 1)
+
+    def test_invalid_price_is_rejected(self):
+        for value in ('abc', 'NaN', 'sNaN', 'Infinity', '-inf'):
+            for param in ('min_price', 'max_price'):
+                with self.subTest(param=param, value=value):
+                    response = self.client.get(f'/api/products/search/?q=phone&{param}={value}')
+                    self.assertEqual(response.status_code, 400)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('buyer'))
+        self.product = make_products(1, quantity=3, price=Decimal('4.00'))[0]
+
+    def test_order_decrements_stock(self):
+        response = self.client.post('/api/orders/', {'product': self.product.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total'], '8.00')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 1)
+
+    def test_out_of_stock_is_reported(self):
+        response = self.client.post('/api/orders/', {'product': self.product.pk, 'quantity': 5})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('disponible 3', str(response.data['quantity']))
+        self.assertFalse(Order.objects.exists())
+        with self.assertRaises(OutOfStock) as ctx:
+            reserve_stock(self.product.pk, 4)
+        self.assertEqual(ctx.exception.available, 3)
+
+
+class ConcurrentStockReservationTests(TransactionTestCase):
+    buyers = 200
+    stock = 50
+
+    def test_no_oversell_under_concurrency(self):
+        product = make_products(1, quantity=self.stock)[0]
+        results = []
+        start = threading.Barrier(self.buyers)
+
+        def buy():
+            try:
+                start.wait()
+                deadline = time.monotonic() + 60
+                while time.monotonic() < deadline:
+                    try:
+                        place_order(product, 1)
+                        results.append(True)
+                        return
+                    except OutOfStock:
+                        results.append(False)
+                        return
+                    except Exception as e:
+                        # SQLite serializes writers; retry on "database is locked".
+                        if 'locked' not in str(e):
+                            raise
+                        time.sleep(random.uniform(0.001, 0.02))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(self.buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(results.count(False), self.buyers - self.stock)
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(Order.objects.count(), self.stock)
+
+
+class AddToCartTests(TestCase):
+    def setUp(self):
+        self.product = make_products(1, quantity=5)[0]
+        self.user = make_user('adder')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_entry_points_share_one_line(self):
+        cases = [
+            ('/api/carts/', {'product_id': self.product.pk, 'quantity': 2}, 201),
+            ('/api/cartitems/', {'product': self.product.pk, 'quantity': 1}, 200),
+        ]
+        for path, body, status in cases:
+            response = self.client.post(path, body, format='json')
+            self.assertEqual(response.status_code, status, response.data)
+        cart = Cart.objects.get(user=self.user)
+        item = CartItemSerializer().create({'cart': cart, 'product': self.product, 'quantity': 1})
+        self.assertEqual((item.quantity, item.current_price), (4, Decimal('10.00')))
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_add_is_one_statement_with_stock_check(self):
+        cart = Cart.objects.create(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            item, created = add_to_cart(cart, self.product.pk, 3)
+        self.assertTrue(created)
+        # The upsert plus the read of the line for the response (and the
+        # test transaction's savepoints).
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual([sql.split()[0] for sql in statements], ['INSERT', 'SELECT'])
+        item, created = add_to_cart(cart, self.product.pk, 2)
+        self.assertEqual((item.quantity, created), (5, False))
+
+        with self.assertRaises(OutOfStock) as raised:
+            add_to_cart(cart, self.product.pk, 1)
+        self.assertEqual((raised.exception.requested, raised.exception.available), (6, 5))
+        with self.assertRaises(Product.DoesNotExist):
+            add_to_cart(cart, 999, 1)
+        response = self.client.post('/api/carts/', {'product_id': self.product.pk, 'quantity': 1}, format='json')
+        self.assertEqual((response.status_code, response.data['available']), (400, 5))
+        self.assertEqual(self.client.post('/api/cartitems/', {'product': 'x'}, format='json').status_code, 404)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.products = make_products(50, quantity=5)
+        self.user = make_user('syncer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, operations):
+        return self.client.post('/api/carts/batch/', {'operations': operations}, format='json')
+
+    def test_fifty_lines_in_a_handful_of_queries(self):
+        operations = [{'op': 'add', 'product': p.pk, 'quantity': 2} for p in self.products]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.sync(operations)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['total_items'], len(response.data['items'])), (100, 50))
+        # get_or_create of the cart (SELECT + INSERT), the products, the
+        # empty new lines, the lines, one upsert, then the cart and its
+        # items for the response.
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(statements), 8)
+
+        first, second, third = self.products[:3]
+        response = self.sync([
+            {'op': 'add', 'product': first.pk, 'quantity': 3},
+            {'op': 'set', 'product': second.pk, 'quantity': 1},
+            {'op': 'remove', 'product': third.pk},
+            {'op': 'add', 'product': third.pk, 'quantity': 1},
+            *({'op': 'remove', 'product': p.pk} for p in self.products[3:]),
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        lines = dict(CartItem.objects.values_list('product_id', 'quantity'))
+        self.assertEqual(lines, {first.pk: 5, second.pk: 1, third.pk: 1})
+        self.assertEqual(response.data['total_items'], 7)
+
+    def test_all_or_nothing(self):
+        product = self.products[0]
+        self.sync([{'op': 'set', 'product': product.pk, 'quantity': 4}])
+        response = self.sync([
+            {'op': 'remove', 'product': self.products[1].pk},
+            {'op': 'add', 'product': product.pk, 'quantity': 2},
+        ])
+        self.assertEqual((response.status_code, response.data['available']), (400, 5))
+        self.assertEqual(self.sync([
+            {'op': 'set', 'product': self.products[1].pk, 'quantity': 1},
+            {'op': 'add', 'product': 999, 'quantity': 1},
+        ]).status_code, 400)
+        self.assertEqual(self.sync([{'op': 'add', 'product': product.pk}]).status_code, 400)
+        self.assertEqual(self.sync([]).status_code, 400)
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')), {product.pk: 4})
+
+
+class ConcurrentAddToCartTests(TransactionTestCase):
+    taps = 50
+
+    def test_no_lost_increments(self):
+        product = make_products(1, quantity=1000)[0]
+        cart = Cart.objects.create(user=make_user('tapper'))
+        errors = []
+        start = threading.Barrier(self.taps)
+
+        def tap():
+            try:
+                start.wait()
+                deadline = time.monotonic() + 60
+                while time.monotonic() < deadline:
+                    try:
+                        add_to_cart(cart, product.pk, 2)
+                        return
+                    except Exception as e:
+                        # SQLite serializes writers; retry on "database is locked".
+                        if 'locked' not in str(e):
+                            errors.append(e)
+                            return
+                        time.sleep(random.uniform(0.001, 0.02))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tap) for _ in range(self.taps)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [2 * self.taps])
+
+
+class ConcurrentBatchAndAddTests(TransactionTestCase):
+    taps = 20
+
+    def test_batch_adds_and_single_adds_all_count(self):
+        product = make_products(1, quantity=1000)[0]
+        cart = Cart.objects.create(user=make_user('syncer'))
+        errors = []
+        start = threading.Barrier(self.taps)
+
+        def tap(number):
+            try:
+                start.wait()
+                deadline = time.monotonic() + 60
+                while time.monotonic() < deadline:
+                    try:
+                        # What /api/carts/batch/ runs, without the response
+                        # read, which could hit "locked" after the commit.
+                        if number % 2:
+                            add_to_cart(cart, product.pk, 2)
+                        else:
+                            apply_cart_operations(cart, [{'op': 'add', 'product': product.pk, 'quantity': 2}])
+                        return
+                    except Exception as e:
+                        # SQLite serializes writers; retry on "database is locked".
+                        if 'locked' not in str(e):
+                            errors.append(e)
+                            return
+                        time.sleep(random.uniform(0.001, 0.02))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tap, args=(number,)) for number in range(self.taps)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [2 * self.taps])
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_double_checkout_orders_once(self):
+        products = make_products(2, quantity=10)
+        user = make_user('double-tapper')
+        cart = Cart.objects.create(user=user)
+        for product in products:
+            add_to_cart(cart, product.pk, 3)
+        results = []
+        start = threading.Barrier(2)
+
+        def checkout():
+            try:
+                start.wait()
+                deadline = time.monotonic() + 60
+                while time.monotonic() < deadline:
+                    try:
+                        results.append(len(checkout_cart(user)[0]))
+                        return
+                    except EmptyCart:
+                        results.append(EmptyCart)
+                        return
+                    except Exception as e:
+                        # SQLite serializes writers; retry on "database is locked".
+                        if 'locked' not in str(e):
+                            results.append(e)
+                            return
+                        time.sleep(random.uniform(0.001, 0.02))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertCountEqual(results, [2, EmptyCart])
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(list(Product.objects.order_by('id').values_list('quantity', flat=True)), [7, 7])
+        self.assertFalse(CartItem.objects.exists())
+
+
+class BulkImportExportTests(TestCase):
+    def setUp(self):
+        product_cache.clear()
+        self.existing = make_products(1, prefix='E', price=Decimal('1.00'))[0]
+
+    def run_import(self, content, suffix):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as handle:
+            handle.write(content)
+        out = io.StringIO()
+        try:
+            call_command('import_products', handle.name, '--batch-size', '2', stdout=out, stderr=io.StringIO())
+        finally:
+            os.unlink(handle.name)
+        return out.getvalue()
+
+    def test_csv_import_upserts_on_code_and_reports_rejects(self):
+        output = self.run_import(
+            "code,name,brand,price,quantity,description,category\n"
+            f"{self.existing.code},Actualizado,Marca,9.99,4,,General\n"
+            "N1,Nuevo,Marca,5.00,1,Desc,General\n"
+            "N2,Malo,Marca,no-es-precio,1,,General\n"
+            "N1,Nuevo v2,Marca,6.00,2,Desc,General\n",
+            '.csv',
+        )
+        self.assertIn('4 filas leídas, 3 importadas, 1 rechazadas', output)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, 'Actualizado')
+        self.assertEqual(self.existing.price, Decimal('9.99'))
+        self.assertEqual(Product.objects.get(code='N1').name, 'Nuevo v2')
+        self.assertFalse(Product.objects.filter(code='N2').exists())
+        # bulk_create skips post_save; the import syncs the cards itself.
+        self.assertEqual(
+            dict(ProductCard.objects.values_list('product__code', 'name')),
+            {self.existing.code: 'Actualizado', 'N1': 'Nuevo v2'},
+        )
+
+    def test_ndjson_import(self):
+        output = self.run_import(
+            '{"code": "J1", "name": "Json", "brand": "B", "price": "2.50", "quantity": 3, "category": "C"}\n'
+            'not json\n',
+            '.ndjson',
+        )
+        self.assertIn('1 importadas, 1 rechazadas', output)
+        self.assertEqual(Product.objects.get(code='J1').quantity, 3)
+
+    def test_export_streams_catalog(self):
+        client = APIClient()
+        client.force_authenticate(make_user('staff', role='STAFF'))
+        response = client.get('/api/products/export/?output=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(json.loads(lines[0])['code'], self.existing.code)
+
+        response = client.get('/api/products/export/?output=csv')
+        rows = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(rows[0], 'code,name,brand,price,quantity,description,category')
+
+    def test_export_requires_staff(self):
+        response = APIClient().get('/api/products/export/')
+        self.assertIn(response.status_code, (401, 403))
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        product_cache.clear()
+        self.client = APIClient()
+        self.user = make_user('shopper')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill(self, count, quantity=2):
+        products = make_products(count, prefix=f"C{Product.objects.count()}-", price=Decimal('3.00'), quantity=5)
+        for product in products:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+        return products
+
+    def test_checkout_creates_orders_and_clears_cart(self):
+        products = self.fill(3)
+        response = self.client.post('/api/carts/checkout/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_items'], 6)
+        self.assertEqual(response.data['total_price'], '18.00')
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(set(Product.objects.filter(pk__in=[p.pk for p in products])
+                             .values_list('quantity', flat=True)), {3})
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        self.fill(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/carts/checkout/')
+        self.fill(12)
+        with CaptureQueriesContext(connection) as large:
+            self.client.post('/api/carts/checkout/')
+        self.assertEqual(len(small), len(large))
+
+    def test_out_of_stock_rolls_back_everything(self):
+        products = self.fill(3)
+        Product.objects.filter(pk=products[1].pk).update(quantity=1)
+        response = self.client.post('/api/carts/checkout/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['product'], products[1].pk)
+        self.assertEqual(response.data['available'], 1)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 3)
+        self.assertEqual(Product.objects.get(pk=products[0].pk).quantity, 5)
+
+    def test_empty_cart(self):
+        self.assertEqual(self.client.post('/api/carts/checkout/').status_code, 400)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = make_user('analyst', role='ADMIN')
+        self.client.force_authenticate(self.user)
+        self.phone = Product.objects.create(code='R1', name='Tel', brand='Samsung', category='Celulares',
+                                            price=Decimal('100.00'), quantity=50)
+        self.tv = Product.objects.create(code='R2', name='TV', brand='LG', category='Televisores',
+                                         price=Decimal('300.00'), quantity=50)
+
+    def snapshot(self):
+        return sorted(SalesRollup.objects.values_list(
+            'granularity', 'period', 'dimension', 'key', 'orders', 'units', 'revenue'))
+
+    def test_orders_update_rollups_incrementally(self):
+        place_order(self.phone, 2)
+        place_order(self.tv, 1)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.phone, quantity=1)
+        checkout_cart(self.user)
+
+        today = timezone.localdate()
+        total = SalesRollup.objects.get(granularity='day', period=today, dimension='total')
+        self.assertEqual((total.orders, total.units, total.revenue), (3, 4, Decimal('600.00')))
+        brand = SalesRollup.objects.get(granularity='month', period=today.replace(day=1),
+                                        dimension='brand', key='Samsung')
+        self.assertEqual((brand.orders, brand.units, brand.revenue), (2, 3, Decimal('300.00')))
+
+        incremental = self.snapshot()
+        call_command('rebuild_rollups', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_dashboard_reads_rollups(self):
+        place_order(self.tv, 2)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/dashboard/?granularity=day')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['labels']), 7)
+        self.assertEqual(response.data['sales'][-1], 600.0)
+        self.assertEqual(response.data['buys'], [0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(response.data['brands'][0]['name'], 'LG')
+        with self.assertNumQueries(0):
+            self.client.get('/api/dashboard/?granularity=day')
+
+    def test_dashboard_validates_range(self):
+        self.assertEqual(self.client.get('/api/dashboard/?granularity=week').status_code, 400)
+        self.assertEqual(self.client.get('/api/dashboard/?start=2026-13-01').status_code, 400)
+        self.assertEqual(self.client.get('/api/dashboard/?start=2026-05-01&end=2026-01-01').status_code, 400)
+        response = self.client.get('/api/dashboard/?start=2026-01-15&end=2026-03-02')
+        self.assertEqual(response.data['labels'], ['Enero 2026', 'Febrero 2026', 'Marzo 2026'])
+
+    def test_dashboard_is_staff_only(self):
+        customer = APIClient()
+        customer.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(make_user("shopper")).access_token}')
+        self.assertEqual(customer.get('/api/dashboard/').status_code, 403)
+        staff = APIClient()
+        staff.force_authenticate(make_user('clerk', role='STAFF'))
+        self.assertEqual(staff.get('/api/dashboard/').status_code, 200)
+
+
+def make_jpeg(size=(1200, 800)):
+    image = Image.new('RGB', size, (200, 30, 30))
+    exif = Image.Exif()
+    exif[0x010F] = 'CameraMaker'
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', exif=exif)
+    return SimpleUploadedFile('foto.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageProcessingTests(TestCase):
+    def setUp(self):
+        product_cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('boss', role='ADMIN'))
+
+    def test_upload_is_processed_into_variants(self):
+        options = dict(settings.IMAGE_PROCESSING, ALWAYS_EAGER=True)
+        with self.settings(MEDIA_ROOT=self.media, IMAGE_PROCESSING=options):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/products/', {
+                    'code': 'IMG1', 'name': 'Foto', 'brand': 'B', 'category': 'C',
+                    'price': '1.00', 'quantity': 1, 'images': [make_jpeg()],
+                }, format='multipart')
+            self.assertEqual(response.status_code, 201)
+
+            image = ProductImage.objects.get()
+            self.assertEqual(image.status, 'READY')
+            self.assertEqual((image.width, image.height), (1200, 800))
+            self.assertEqual(sorted(image.variants, key=int), ['160', '480', '960', '1200'])
+            with image.image.open('rb') as handle:
+                self.assertFalse(Image.open(handle).info.get('exif'))
+            with default_storage.open(image.variants['160'], 'rb') as handle:
+                thumb = Image.open(handle)
+                self.assertEqual((thumb.format, thumb.width), ('WEBP', 160))
+
+            data = self.client.get(f'/api/products/{response.data["id"]}/').json()
+            srcset = data['images'][0]['srcset']
+            self.assertTrue(srcset.startswith('http://testserver/media/products/variants/'))
+            self.assertIn(' 160w, ', srcset)
+
+    def test_failed_processing_keeps_the_original(self):
+        with self.settings(MEDIA_ROOT=self.media):
+            image = ProductImage.objects.create(product=make_products(1)[0], image=make_jpeg())
+            original = image.image.name
+            with mock.patch('api.images._encode', side_effect=[b'stripped', OSError]), \
+                    self.assertLogs('api.images', 'ERROR'):
+                process_image(image.pk)
+            image.refresh_from_db()
+            self.assertEqual((image.status, image.image.name), ('FAILED', original))
+            with image.image.open('rb') as handle:
+                self.assertTrue(Image.open(handle).info.get('exif'))
+            self.assertEqual(sorted(os.listdir(os.path.join(self.media, 'products'))),
+                             [os.path.basename(original)])
+
+    def test_srcset_uses_storage_urls_off_the_filesystem(self):
+        image = ProductImage(product=make_products(1)[0], image='products/a.jpg',
+                             variants={'480': 'products/variants/a_480w.webp', '160': 'products/variants/a_160w.webp'})
+        storage = mock.Mock()
+        storage.url.side_effect = lambda name: f'https://cdn.example.com/{name}'
+        with mock.patch.object(ProductImage._meta.get_field('image'), 'storage', storage):
+            data = ProductImageSerializer(image, context={}).data
+        self.assertEqual(data['image'], 'https://cdn.example.com/products/a.jpg')
+        self.assertEqual(data['srcset'], 'https://cdn.example.com/products/variants/a_160w.webp 160w, '
+                                         'https://cdn.example.com/products/variants/a_480w.webp 480w')
+
+
+class ImageProcessorPoolTests(TransactionTestCase):
+    def test_pool_processes_after_commit(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with self.settings(MEDIA_ROOT=media):
+            product = make_products(1)[0]
+            image = ProductImage.objects.create(product=product, image=make_jpeg((300, 200)))
+            processor.wait(timeout=30)
+            image.refresh_from_db()
+        self.assertEqual(image.status, 'READY')
+        self.assertEqual(sorted(image.variants, key=int), ['160', '300'])
+
+
+@override_settings(ASYNC_SYNC_WORKERS=0)
+# Pool threads use their own connections, which cannot see the test transaction.
+@override_settings(ASYNC_SYNC_WORKERS=0)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.user = make_user('async-buyer')
+        self.products = make_products(3)
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {'headers': {'Authorization': f'Bearer {token}'}}
+
+    async def test_product_list_matches_sync_endpoint(self):
+        response = await self.async_client.get('/api/async/products/?page_size=2')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([item['id'] for item in data['results']],
+                         [p.pk for p in reversed(self.products)][:2])
+        response = await self.async_client.get(data['next'].replace('http://testserver', ''))
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.products[0].pk])
+
+    async def test_product_detail(self):
+        response = await self.async_client.get(f'/api/async/products/{self.products[0].pk}/')
+        self.assertEqual(response.json()['code'], self.products[0].code)
+        response = await self.async_client.get('/api/async/products/999/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_cart_requires_authentication(self):
+        response = await self.async_client.get('/api/async/cart/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_add_and_read_cart(self):
+        url = '/api/async/cart/'
+        body = {'product_id': self.products[0].pk, 'quantity': 2}
+        response = await self.async_client.post(url, body, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.post(url, body, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quantity'], 4)
+
+        carts = (await self.async_client.get(url, **self.auth)).json()
+        self.assertEqual(carts[0]['total_items'], 4)
+        self.assertEqual(carts[0]['total_price'], '40.00')
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('claims-user')
+        self.admin = make_user('claims-admin', role='ADMIN')
+        self.client = APIClient()
+
+    def authorize(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def user_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if User._meta.db_table in q['sql']]
+
+    def test_login_token_needs_no_user_queries(self):
+        response = self.client.post('/api/login/', {'email': self.user.email, 'password': 'secret123'})
+        self.authorize(response.data['access'])
+        # The first request caches the revocation state.
+        self.assertEqual(len(self.user_queries('/api/carts/')), 1)
+        self.assertEqual(self.user_queries('/api/carts/'), [])
+        self.assertEqual(self.user_queries('/api/cartitems/'), [])
+
+    def test_legacy_tokens_are_loaded_from_the_database(self):
+        self.authorize(RefreshToken.for_user(self.user).access_token)
+        self.assertEqual(len(self.user_queries('/api/carts/')), 1)
+
+    def test_role_change_invalidates_access_token_until_refresh(self):
+        refresh = UserRefreshToken.for_user(self.user)
+        self.authorize(refresh.access_token)
+        self.assertEqual(self.client.get('/api/carts/').status_code, 200)
+
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        response = admin.post(f'/api/users/{self.user.pk}/assign_role/', {'role': 'STAFF'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/carts/').status_code, 401)
+
+        response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)})
+        self.authorize(response.data['access'])
+        self.assertEqual(self.client.get('/api/products/export/').status_code, 200)
+
+    def test_revoke_tokens_rejects_access_and_refresh(self):
+        refresh = UserRefreshToken.for_user(self.user)
+        self.authorize(refresh.access_token)
+        response = self.client.post(f'/api/users/{self.user.pk}/revoke_tokens/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/carts/').status_code, 401)
+        response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_inactive_user_is_rejected(self):
+        self.authorize(UserRefreshToken.for_user(self.user).access_token)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+        self.assertEqual(self.client.get('/api/carts/').status_code, 401)
+
+    @override_settings(JWT_USER_CACHE_TTL=0)
+    def test_claims_user_loads_other_fields_lazily(self):
+        self.authorize(UserRefreshToken.for_user(self.user).access_token)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/users/{self.user.pk}/')
+        self.assertEqual(response.data['email'], self.user.email)
+        # Only the users/<pk> lookup itself touches the table.
+        self.assertEqual(len([q for q in queries if User._meta.db_table in q['sql']]), 1)
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('login-user')
+        self.client = APIClient()
+
+    def login(self, password='secret123', email=None):
+        return self.client.post('/api/login/', {'email': email or self.user.email, 'password': password})
+
+    def test_login_looks_the_user_up_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in queries if User._meta.db_table in q['sql']]), 1)
+
+    def test_wrong_password_and_unknown_email_look_the_same(self):
+        self.assertEqual(self.login(password='wrong').status_code, 401)
+        self.assertEqual(self.login(email='nobody@example.com').status_code, 401)
+
+    def test_non_string_credentials_are_rejected_before_the_limiter(self):
+        limiter = LoginRateLimiter({'BACKEND': 'local'})
+        with mock.patch('api.views.login_limiter', limiter), mock.patch.object(limiter, 'check') as check:
+            for email, password in [(12345, 'secret123'), (['a@example.com'], 'secret123'),
+                                    ({'x': 1}, 'secret123'), (self.user.email, 12345)]:
+                response = self.client.post('/api/login/', {'email': email, 'password': password}, format='json')
+                self.assertEqual(response.status_code, 400, (email, password))
+            self.assertEqual(self.client.post('/api/login/', {'email': None, 'password': 'x'},
+                                              format='json').status_code, 400)
+        check.assert_not_called()
+
+    def test_rate_limited_attempts_skip_hashing(self):
+        limiter = LoginRateLimiter({'BACKEND': 'local', 'IP': (100, 0), 'ACCOUNT': (2, 0.5)})
+        with mock.patch('api.views.login_limiter', limiter), \
+                mock.patch.object(User, 'check_password', autospec=True, return_value=False) as check:
+            self.assertEqual(self.login(password='wrong').status_code, 401)
+            self.assertEqual(self.login(password='wrong').status_code, 401)
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(check.call_count, 2)
+
+    def test_cache_buckets_are_shared_per_ip(self):
+        limiter = LoginRateLimiter({'IP': (1, 0), 'ACCOUNT': (10, 0)})
+        self.assertIsNone(limiter.check('10.0.0.1', 'a@example.com'))
+        # A second limiter stands in for another worker.
+        other = LoginRateLimiter({'IP': (1, 0), 'ACCOUNT': (10, 0)})
+        self.assertEqual(other.check('10.0.0.1', 'b@example.com'), 0)
+        self.assertIsNone(other.check('10.0.0.2', 'b@example.com'))
+
+    def test_only_failed_logins_count_against_the_account(self):
+        limiter = LoginRateLimiter({'BACKEND': 'local', 'IP': (100, 0), 'ACCOUNT': (1, 0)})
+        with mock.patch('api.views.login_limiter', limiter):
+            self.assertEqual(self.login().status_code, 200)
+            self.assertEqual(self.login().status_code, 200)
+            self.assertEqual(self.login(password='wrong').status_code, 401)
+            self.assertEqual(self.login().status_code, 429)
+
+    def test_cache_bucket_counts_atomically_and_refunds(self):
+        bucket = CacheTokenBucket(2, 0, 'test')
+        self.assertEqual(bucket.consume('k'), (True, 0))
+        self.assertEqual(bucket.consume('k'), (True, 0))
+        self.assertEqual(bucket.consume('k'), (False, None))
+        bucket.refund('k')
+        self.assertEqual(bucket.consume('k'), (True, 0))
+
+        refilling = CacheTokenBucket(1, 0.5, 'test')
+        self.assertTrue(refilling.consume('k')[0])
+        allowed, retry_after = refilling.consume('k')
+        self.assertFalse(allowed)
+        self.assertTrue(1 <= retry_after <= 4)
+
+    def test_client_ip_trusts_only_configured_proxies(self):
+        limiter = LoginRateLimiter({'TRUSTED_PROXIES': ['10.0.0.0/8']})
+        factory = RequestFactory()
+        forwarded = '198.51.100.1, 203.0.113.9, 10.0.0.7'
+        request = factory.post('/api/login/', REMOTE_ADDR='10.0.0.5', HTTP_X_FORWARDED_FOR=forwarded)
+        self.assertEqual(limiter.client_ip(request), '203.0.113.9')
+        spoofed = factory.post('/api/login/', REMOTE_ADDR='203.0.113.50', HTTP_X_FORWARDED_FOR=forwarded)
+        self.assertEqual(limiter.client_ip(spoofed), '203.0.113.50')
+        self.assertEqual(LoginRateLimiter().client_ip(request), '10.0.0.5')
+
+    def test_local_bucket_refills(self):
+        bucket = LocalTokenBucket(1, 10)
+        self.assertEqual(bucket.consume('k'), (True, 0))
+        self.assertEqual(bucket.consume('k'), (False, 1))
+        time.sleep(0.15)
+        self.assertTrue(bucket.consume('k')[0])
+
+    def test_password_is_rehashed_when_cost_changes(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.assertEqual(self.login().status_code, 200)
+            self.user.refresh_from_db()
+            self.assertEqual(self.user.password.split('$')[1], '1000')
+            self.assertEqual(self.login().status_code, 200)
+
+
+@override_settings(DASHBOARD_CACHE_TTL=0)
+class QueryPlanTests(TestCase):
+    """
+    Every GET endpoint must keep its query count and read each table through
+    an index. `scans` lists tables an endpoint may walk in full because it
+    returns all of their rows.
+    """
+    ENDPOINTS = [
+        # (role, path, queries, scans, vendor)
+        # Catalog reads include the ETag/Last-Modified validator query.
+        ('CUSTOMER', '/api/products/', 3, (), None),
+        ('CUSTOMER', '/api/products/{product}/', 3, (), None),
+        ('CUSTOMER', '/api/products/?view=card', 2, ('api_productcard',), None),
+        ('CUSTOMER', '/api/products/search/?brand=Acme', 6, (), None),
+        ('CUSTOMER', '/api/products/search/?category=Hogar', 6, (), None),
+        ('CUSTOMER', '/api/products/search/?q=producto', 6, (), 'postgresql'),
+        ('CUSTOMER', '/api/users/{customer}/', 1, (), None),
+        ('CUSTOMER', '/api/carts/', 2, (), None),
+        ('CUSTOMER', '/api/cartitems/', 1, (), None),
+        ('ADMIN', '/api/orders/', 1, (), None),
+        ('ADMIN', '/api/users/', 1, ('api_user',), None),
+        ('ADMIN', '/api/carts/', 2, ('api_cart',), None),
+        ('ADMIN', '/api/cartitems/', 1, (), None),
+        ('ADMIN', '/api/dashboard/', 3, (), None),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+        products = make_products(30, brand='Acme', category='Hogar')
+        make_products(30, prefix='Q', brand='Otra', category='Oficina')
+        self.users = {'CUSTOMER': make_user('plan-customer'), 'ADMIN': make_user('plan-admin', role='ADMIN')}
+        cart = Cart.objects.create(user=self.users['CUSTOMER'])
+        for product in products[:3]:
+            CartItem.objects.create(cart=cart, product=product, quantity=1, current_price=product.price)
+        place_order(products[0], 1)
+        self.ids = {'product': products[0].pk, 'customer': self.users['CUSTOMER'].pk}
+
+    def capture(self, role, path):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(self.users[role]).access_token}')
+        # Warm the auth state and search index, then bust the response cache
+        # with a throwaway parameter so the measured request hits the database.
+        client.get(path)
+        path += ('&' if '?' in path else '?') + 'plan=1'
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        return [query['sql'] for query in queries]
+
+    def test_endpoints_use_indexes_without_extra_queries(self):
+        for role, path, count, allowed, vendor in self.ENDPOINTS:
+            if vendor and vendor != connection.vendor:
+                continue
+            path = path.format(**self.ids)
+            with self.subTest(role=role, path=path):
+                queries = self.capture(role, path)
+                self.assertEqual(len(queries), count, queries)
+                with prefer_indexes(connection):
+                    for sql in queries:
+                        self.assertLessEqual(full_scans(connection, sql), set(allowed), sql)
+
+    def test_duplicate_cart_lines_are_rejected(self):
+        cart = Cart.objects.get(user=self.users['CUSTOMER'])
+        item = cart.cartitem_set.first()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=cart, product=item.product, quantity=1, current_price=item.current_price)
+
+
+@override_settings(REQUEST_METRICS={'SAMPLE_RATE': 1.0})
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+        reset_metrics()
+        self.products = make_products(4)
+        self.staff = make_user('metrics-staff', role='STAFF')
+        self.client = APIClient()
+
+    def test_server_timing_reports_queries_and_phases(self):
+        response = self.client.get('/api/products/')
+        timing = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'app', 'render', 'total'})
+        # Validators, the page and its images.
+        self.assertTrue(timing['db'].startswith('desc="3 queries"'))
+
+    def test_metrics_endpoint_exposes_histograms(self):
+        self.client.get('/api/products/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        self.client.force_authenticate(self.staff)
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('# TYPE api_request_duration_seconds histogram', body)
+        self.assertIn('api_request_queries_bucket{view="product-list",method="GET",le="2"} 0', body)
+        self.assertIn('api_request_queries_bucket{view="product-list",method="GET",le="3"} 1', body)
+        self.assertIn('api_request_queries_count{view="product-list",method="GET"} 1', body)
+
+    @override_settings(REQUEST_METRICS={'SAMPLE_RATE': 0})
+    def test_unsampled_requests_are_not_profiled(self):
+        response = self.client.get('/api/products/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_repeated_sql_shapes_are_flagged(self):
+        # Serializing without the fetch plan loads images once per product.
+        with recording() as recorder:
+            ProductSerializer(Product.objects.order_by('id'), many=True).data
+        repeated = recorder.repeated(3)
+        self.assertEqual(list(repeated.values()), [len(self.products)])
+        self.assertIn('api_productimage', next(iter(repeated)))
+
+        with self.assertNoLogs('api.metrics', 'WARNING'):
+            self.client.get('/api/products/')
+
+    async def test_async_views_are_attributed(self):
+        response = await self.async_client.get('/api/async/products/')
+        self.assertIn('db;desc="2 queries"', response['Server-Timing'])
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_route_has_a_scenario(self):
+        from .urls import urlpatterns
+        self.assertEqual(route_names(urlpatterns) - set(SCENARIOS), set())
+
+    def test_dataset_is_seeded(self):
+        people = generate_dataset(20, users=5, carts=3, orders=40, images_per_product=2, items_per_cart=4)
+        self.assertEqual(len(people), 5)
+        self.assertEqual(ProductImage.objects.count(), 40)
+        self.assertEqual(CartItem.objects.count(), 12)
+        self.assertEqual(Order.objects.count(), 40)
+        self.assertTrue(people[0].check_password('bench'))
+        total = SalesRollup.objects.filter(granularity='month', dimension='total').get()
+        self.assertEqual(total.orders, 40)
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        before = {'route': {'status': 200, 'queries': 2, 'p50_ms': 10.0, 'peak_kib': 100.0}}
+        self.assertEqual(compare(before, {'route': dict(before['route'], p50_ms=12.0)}, 0.25), [])
+        problems = compare(before, {'route': dict(before['route'], queries=3, p50_ms=13.0)}, 0.25)
+        self.assertEqual(problems, ["route: queries 2 -> 3", "route: p50_ms 10.00 -> 13.00"])
+        self.assertEqual(compare(before, {}, 0.25), ["route: no longer measured"])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+        self.products = make_products(3)
+        self.admin = make_user('etag-admin', role='ADMIN')
+        self.client = APIClient()
+
+    def assertNotModified(self, path, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        return len(queries)
+
+    def test_product_list_revalidates_without_queries(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.assertNotModified('/api/products/', if_none_match=etag), 0)
+        self.assertEqual(
+            self.assertNotModified('/api/products/', if_modified_since=response['Last-Modified']), 0,
+        )
+
+        self.products[0].name = 'Renombrado'
+        self.products[0].save()
+        response = self.client.get('/api/products/', headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_validators_come_from_the_page(self):
+        etag = self.client.get('/api/products/')['ETag']
+        product_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 304)
+        sql = ' '.join(query['sql'] for query in queries).upper()
+        self.assertNotIn('MAX(', sql)
+        self.assertNotIn('COUNT(', sql)
+
+    def test_product_detail_changes_with_images(self):
+        path = f'/api/products/{self.products[0].pk}/'
+        etag = self.client.get(path)['ETag']
+        self.assertNotModified(path, if_none_match=etag)
+        ProductImage.objects.create(product=self.products[0], image='https://cdn.example.com/a.jpg')
+        self.assertNotEqual(self.client.get(path)['ETag'], etag)
+        self.assertEqual(self.client.get('/api/products/999/').status_code, 404)
+
+    def test_cart_revalidation_skips_serialization(self):
+        customer = make_user('etag-customer')
+        cart = Cart.objects.create(user=customer)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=1, current_price=10)
+        path = f'/api/carts/{cart.pk}/'
+        self.client.force_authenticate(self.admin)
+        etag = self.client.get(path)['ETag']
+        # Only the cart lookup with its aggregates; no item prefetch.
+        self.assertEqual(self.assertNotModified(path, if_none_match=etag), 1)
+
+        item = cart.cartitem_set.get()
+        item.quantity = 2
+        item.save()
+        response = self.client.get(path, headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_items'], 2)
+
+        # Permissions still apply before any 304.
+        self.client.force_authenticate(make_user('etag-other'))
+        self.assertEqual(self.client.get(path, headers={'if_none_match': etag}).status_code, 404)
+
+    def test_owner_revalidates_own_cart(self):
+        customer = make_user('etag-owner')
+        cart = Cart.objects.create(user=customer)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=1, current_price=10)
+        path = f'/api/carts/{cart.pk}/'
+        self.client.force_authenticate(customer)
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_items'], 1)
+        self.assertEqual(self.assertNotModified(path, if_none_match=response['ETag']), 1)
+
+
+class FastJSONTests(TestCase):
+    DATA = {
+        'price': Decimal('10.50'),
+        'when': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'day': date(2024, 5, 1),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'label': gettext_lazy('Producto'),
+        'text': 'ñandú\u2028\u2029fin',
+        1: [None, True, 1.5],
+    }
+
+    def test_renderer_matches_drf(self):
+        expected = JSONRenderer().render(self.DATA)
+        self.assertEqual(FastJSONRenderer().render(self.DATA), expected)
+        self.assertEqual(FastJSONRenderer().render(self.DATA, 'application/json; indent=2'),
+                         JSONRenderer().render(self.DATA, 'application/json; indent=2'))
+        # orjson refuses integers over 64 bits; the stdlib takes over.
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+        with mock.patch('api.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.DATA), expected)
+
+    def test_parser(self):
+        body = '{"name": "ñandú", "quantity": 3, "big": 1180591620717411303424}'.encode()
+        parsed = FastJSONParser().parse(io.BytesIO(body))
+        self.assertEqual(parsed, {'name': 'ñandú', 'quantity': 3, 'big': 2 ** 70})
+        for bad in (b'{"name": ', b'{"price": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(bad))
+
+    def test_lean_lists_match_regular_serializers(self):
+        products = make_products(3)
+        ProductImage.objects.create(product=products[0], image='https://cdn.example.com/a.jpg', is_main=True)
+        ProductImage.objects.create(product=products[0], image='products/b.jpg', variants={'320': 'products/b-320.webp'})
+        cart = Cart.objects.create(user=make_user('lean'))
+        CartItem.objects.create(cart=cart, product=products[1], quantity=2, current_price=Decimal('3.5'))
+        place_order(products[2], 1)
+
+        cases = [
+            (ProductSerializer, Product.objects.prefetch_related('images')),
+            (ProductImageSerializer, ProductImage.objects.all()),
+            (CartItemSerializer, CartItem.objects.select_related('product')),
+            (OrderSerializer, Order.objects.select_related('product')),
+        ]
+        for serializer_class, queryset in cases:
+            with self.subTest(serializer_class.__name__):
+                lean = serializer_class(queryset, many=True)
+                self.assertIsInstance(lean, LeanListSerializer)
+                regular = serializers.ListSerializer(queryset, child=serializer_class())
+                self.assertEqual(json.dumps(lean.data), json.dumps(regular.data))
+
+
+class CompressionAndStreamingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+        self.products = make_products(30)
+        for product in self.products[:5]:
+            place_order(product, 1)
+        self.admin = make_user('stream-admin', role='ADMIN')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_negotiates_encoding(self):
+        # brotli and zstandard are optional; negotiate as if both were installed.
+        with mock.patch.dict('api.compression.COMPRESSORS', {'br': object, 'zstd': object}):
+            self.assertEqual(choose_encoding('gzip, deflate', ('zstd', 'br', 'gzip')), 'gzip')
+            self.assertEqual(choose_encoding('gzip;q=0.5, br', ('gzip', 'br')), 'br')
+            self.assertEqual(choose_encoding('*;q=0.1, gzip;q=0', ('gzip',)), None)
+            self.assertEqual(choose_encoding('identity', ('gzip',)), None)
+
+    def test_skips_encodings_that_are_not_installed(self):
+        with mock.patch.dict('api.compression.COMPRESSORS', {'gzip': object}, clear=True):
+            self.assertEqual(choose_encoding('gzip;q=0.5, br', ('gzip', 'br')), 'gzip')
+            self.assertEqual(choose_encoding('zstd, br', ('zstd', 'br', 'gzip')), None)
+
+    def test_compresses_large_bodies_only(self):
+        plain = self.client.get('/api/products/')
+        response = self.client.get('/api/products/', headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertTrue(response['ETag'].startswith('W/'))
+        revalidated = self.client.get('/api/products/', headers={
+            'accept-encoding': 'gzip', 'if-none-match': response['ETag'],
+        })
+        self.assertEqual(revalidated.status_code, 304)
+
+        small = self.client.get(f'/api/products/{self.products[0].pk}/', headers={'accept-encoding': 'gzip'})
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+    def test_streams_whole_list(self):
+        response = self.client.get('/api/orders/?stream=ndjson')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        expected = self.client.get('/api/orders/').json()['results']
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+        with mock.patch.object(ProductViewSet, 'stream_chunk_size', 7):
+            response = self.client.get('/api/products/?stream=json')
+            products = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(products), 30)
+        self.assertEqual(products[0], self.client.get('/api/products/').json()['results'][0])
+        self.assertEqual(self.client.get('/api/products/?stream=xml').status_code, 400)
+
+    def test_streams_are_staff_only(self):
+        anonymous = APIClient()
+        self.assertEqual(anonymous.get('/api/products/?stream=json').status_code, 401)
+        customer = APIClient()
+        customer.force_authenticate(make_user('stream-customer'))
+        self.assertEqual(customer.get('/api/products/?stream=json').status_code, 403)
+        self.assertEqual(customer.get('/api/products/').status_code, 200)
+
+    async def test_streams_under_asgi(self):
+        auth = {'Authorization': f'Bearer {UserRefreshToken.for_user(self.admin).access_token}'}
+        response = await self.async_client.get('/api/orders/?stream=ndjson', headers=auth)
+        # An async iterator: Django would buffer a sync one into a list.
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual(len(lines), 5)
+        response = await self.async_client.get('/api/products/export/?output=ndjson', headers=auth)
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(b''.join([chunk async for chunk in response.streaming_content]).splitlines()), 30)
+
+    def test_compresses_streams(self):
+        response = self.client.get('/api/orders/?stream=json', headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(b''.join(response.streaming_content)))), 5)
+
+
+class ProductCardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+        self.product = make_products(1)[0]
+        self.client = APIClient()
+
+    def card(self):
+        return ProductCard.objects.get(product=self.product)
+
+    def test_cards_follow_product_image_and_stock_writes(self):
+        card = self.card()
+        self.assertEqual((card.name, card.price, card.in_stock, card.image), ('Producto 0', Decimal('10.00'), True, ''))
+
+        ProductImage.objects.create(product=self.product, image='products/a.jpg')
+        main = ProductImage.objects.create(product=self.product, image='https://cdn.example.com/b.jpg', is_main=True)
+        self.assertEqual(self.card().image, 'https://cdn.example.com/b.jpg')
+        main.delete()
+        self.assertEqual(self.card().image, '/media/products/a.jpg')
+
+        reserve_stock(self.product.pk, 10)
+        self.product.refresh_from_db()
+        self.assertEqual((self.card().in_stock, self.card().updated_at), (False, self.product.updated_at))
+
+        self.product.price = Decimal('12.50')
+        self.product.save()
+        self.assertEqual(self.card().price, Decimal('12.50'))
+        self.product.delete()
+        self.assertFalse(ProductCard.objects.exists())
+
+    def test_card_view_and_rebuild(self):
+        ProductImage.objects.create(product=self.product, image='products/a.jpg', is_main=True)
+        make_products(2, prefix='K', quantity=0)
+        response = self.client.get('/api/products/?view=card')
+        self.assertEqual(response.status_code, 200)
+        cards = response.json()['results']
+        self.assertEqual([card['id'] for card in cards],
+                         [product['id'] for product in self.client.get('/api/products/').json()['results']])
+        self.assertEqual(cards[-1], {
+            'id': self.product.pk, 'name': 'Producto 0', 'brand': 'Marca', 'price': '10.00',
+            'in_stock': True, 'image': 'http://testserver/media/products/a.jpg',
+        })
+        self.assertEqual([card['in_stock'] for card in cards], [False, False, True])
+
+        ProductCard.objects.all().delete()
+        call_command('rebuild_product_cards', stdout=io.StringIO())
+        self.assertEqual(ProductCard.objects.count(), 3)
+
+
+@override_settings(READ_REPLICAS={'ALIASES': ['replica1'], 'STICKY_SECONDS': 60})
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('reader')
+        self.router = ReplicaRouter()
+
+    def routed(self, method, user):
+        request = RequestFactory().generic(method, '/api/products/')
+        request.user = user
+        token = route_reads(request)
+        try:
+            return Product.objects.all().db, self.router.db_for_write(Product)
+        finally:
+            release(token)
+
+    def test_safe_reads_use_the_replica_until_the_user_writes(self):
+        self.assertEqual(self.routed('GET', AnonymousUser()), ('replica1', 'default'))
+        self.assertEqual(self.routed('GET', self.user), ('replica1', 'default'))
+        self.assertEqual(self.routed('POST', self.user), ('default', 'default'))
+        self.assertEqual(Product.objects.all().db, 'default')
+        self.assertIs(self.router.allow_migrate('replica1', 'api'), False)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        product = make_products(1)[0]
+        # Failed writes do not pin; successful ones pin only their user.
+        self.assertEqual(client.post('/api/carts/batch/', {'operations': []}, format='json').status_code, 400)
+        self.assertEqual(self.routed('GET', self.user)[0], 'replica1')
+        response = client.post('/api/carts/batch/', {'operations': [{'op': 'add', 'product': product.pk, 'quantity': 1}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.routed('GET', self.user)[0], 'default')
+        self.assertEqual(self.routed('GET', make_user('other'))[0], 'replica1')
+
+    def test_cache_fills_after_a_write_read_the_primary(self):
+        product_cache.clear()
+        writer = make_user('catalog-admin', role='ADMIN')
+        request = RequestFactory().get('/api/products/')
+        request.user = AnonymousUser()
+        self.assertEqual(choose_replica(request, product_cache), 'replica1')
+
+        client = APIClient()
+        client.force_authenticate(writer)
+        response = client.post('/api/products/', {
+            'code': 'FRESH', 'name': 'Recién creado', 'brand': 'Marca', 'price': '1.00',
+            'quantity': 1, 'category': 'General',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # 'replica1' is not a configured database, so these reads only work
+        # if they stay on the primary, and the cached page is the fresh one.
+        for user in (self.user, writer):
+            client.force_authenticate(user)
+            response = client.get('/api/products/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'][0]['code'], 'FRESH')
+
+
+@skipUnless(settings.READ_REPLICAS['ALIASES'], "No read replica configured (DB_REPLICAS).")
+class ReplicaReadTests(TransactionTestCase):
+    # The replica is a second connection: it only sees committed rows.
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        make_products(3)
+        # Start past the post-write window of the catalog inserts above.
+        product_cache.clear()
+        self.replica = settings.READ_REPLICAS['ALIASES'][0]
+
+    def test_catalog_reads_hit_the_replica(self):
+        client = APIClient()
+        client.force_authenticate(make_user('writer', role='ADMIN'))
+        with CaptureQueriesContext(connections[self.replica]) as replica_queries:
+            self.assertEqual(client.get('/api/products/').status_code, 200)
+        self.assertTrue(replica_queries)
+        self.assertEqual(client.post('/api/products/', {
+            'code': 'NEW', 'name': 'Nuevo', 'brand': 'Marca', 'price': '1.00', 'quantity': 1, 'category': 'General',
+        }, format='json').status_code, 201)
+        reader = APIClient()
+        reader.force_authenticate(make_user('reader'))
+        for user_client in (client, reader):
+            with CaptureQueriesContext(connections[self.replica]) as replica_queries:
+                response = user_client.get('/api/products/?fresh=1')
+            self.assertEqual(response.json()['results'][0]['code'], 'NEW')
+            self.assertFalse(replica_queries)
+
+
+class AdminChangelistTests(TestCase):
+    rows = 100_000
+    # Session and user, then the count, the page and one query per
+    # bounded filter, whatever the table size.
+    CHANGELISTS = [
+        ('/admin/api/order/', 4),
+        ('/admin/api/order/?q=P00001', 4),
+        ('/admin/api/product/', 6),
+        ('/admin/api/product/?brand=Marca', 6),
+        ('/admin/api/productimage/', 4),
+        ('/admin/api/cart/', 4),
+        ('/admin/api/cartitem/', 4),
+        ('/admin/api/user/', 4),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        products = make_products(3)
+        cls.admin = User.objects.create_superuser(
+            username='root', email='root@example.com', password='secret123', role='ADMIN',
+        )
+        cart = Cart.objects.create(user=cls.admin)
+        for product in products:
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            ProductImage.objects.create(product=product, image=f'https://cdn.example.com/{product.pk}.jpg', status='READY')
+        Order.objects.bulk_create(
+            (Order(product=products[i % 3], quantity=1, total=products[0].price) for i in range(cls.rows)),
+            batch_size=5000,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_changelist_query_counts_do_not_grow_with_rows(self):
+        self.client.force_login(self.admin)
+        for path, count in self.CHANGELISTS:
+            with self.subTest(path=path), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(queries), count, [query['sql'] for query in queries])
+        self.assertEqual(self.client.get('/admin/api/order/').context['cl'].result_count, self.rows)
+
+    def test_filtered_counts_are_exact(self):
+        queryset = Order.objects.filter(product__code='P00001')
+        self.assertEqual(count_rows(queryset, exact_below=1), (self.rows // 3, False))
+        self.assertEqual(estimated_count(queryset), self.rows // 3)
+
+
+class ApproximateCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+        self.products = make_products(8)
+        self.user = make_user('counter')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count(self, path):
+        data = self.client.get(path).json()
+        return data['count'], data['count_estimated']
+
+    def test_lists_count_only_on_request(self):
+        response = self.client.get('/api/products/?page_size=2')
+        self.assertNotIn('count', response.json())
+        self.assertEqual(self.count('/api/products/?page_size=2&count=1'), (8, False))
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=1)
+        self.assertEqual(self.count('/api/cartitems/?count=true'), (1, False))
+
+    @override_settings(ROW_COUNTS={'EXACT_BELOW': 5})
+    def test_large_tables_use_a_cached_count_kept_by_signals(self):
+        self.assertEqual(count_rows(Product.objects.all()), (8, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(count_rows(Product.objects.all()), (8, True))
+        make_products(1, prefix='N')
+        self.assertEqual(count_rows(Product.objects.all()), (9, True))
+        self.products[0].delete()
+        self.assertEqual(self.count('/api/products/?count=1'), (8, True))
+        # Filtered counts are exact (and small here).
+        self.assertEqual(count_rows(Product.objects.filter(code__startswith='P')), (7, False))
+
+    async def test_async_list_counts(self):
+        response = await self.async_client.get('/api/async/products/?count=1')
+        self.assertEqual((response.json()['count'], response.json()['count_estimated']), (8, False))
 
-# Create your tests here.
@@ -3,7 +3,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from django.conf import settings
 from django.conf.urls.static import static
-from .views import ProductViewSet, OrderViewSet, UserViewSet, CartViewSet, CartItemViewSet, login_view, dashboard_view
+from .views import ProductViewSet, OrderViewSet, UserViewSet, CartViewSet, CartItemViewSet, login_view, dashboard_view, metrics_view
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet)
@@ -18,6 +19,11 @@ urlpatterns = [
     path('', include(router.urls)),
     path('login/', login_view, name='login'),
     path('dashboard/', dashboard_view, name='dashboard'),
+    path('metrics/', metrics_view, name='metrics'),
     path('signup/', UserViewSet.as_view({'post': 'create'}), name='signup'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    # ASGI-native versions of the catalog and cart hot paths.
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('async/cart/', async_views.cart, name='async-cart'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
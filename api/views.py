@@ -5,18 +5,142 @@ from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
-from .models import Product, Cart, CartItem, User, Order, ProductImage
-from .serializers import (ProductSerializer, CartSerializer, CartItemSerializer, UserSerializer, OrderSerializer, ProductImageSerializer)
-from .permissions import (IsAdminOrReadOnly, IsOwnerOrAdmin)
+from .models import Product, ProductCard, Cart, CartItem, User, Order, ProductImage
+from .serializers import (ProductSerializer, ProductCardSerializer, CartBatchSerializer, CartSerializer, CartItemSerializer, UserSerializer, OrderSerializer, ProductImageSerializer)
+from .permissions import (IsAdminOrReadOnly, IsOwnerOrAdmin, IsAdminOrStaff)
+from .pagination import KeysetPagination
+from .renderers import FastJSONParser
+from .querysets import OptimizedQuerysetMixin
+from .cache import CachedReadMixin
+from .replicas import ReplicaReadMixin, replica_reads
+from .conditional import ConditionalGetMixin, dump_validators, load_validators, make_validators
+from .search import search_products
+from .counts import count_rows
+from .streaming import StreamingListMixin, streaming_response
+from .bulk import export_rows
+from .services import CartChanged, EmptyCart, OutOfStock, add_to_cart, apply_cart_operations, checkout_cart
+from .rollups import GRANULARITIES, breakdown, period_start, periods_between, previous_period, series
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+from django.db.models import prefetch_related_objects
+from django.http import Http404, HttpResponse
+from . import metrics
 
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
 
-class ProductViewSet(viewsets.ModelViewSet):
+
+class ProductViewSet(ReplicaReadMixin, ConditionalGetMixin, StreamingListMixin, CachedReadMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset=Product.objects.all().order_by('-created_at')
     serializer_class=ProductSerializer
     permission_classes=[IsAdminOrReadOnly]
-    parser_classes=[parsers.MultiPartParser, parsers.FormParser, parsers.JSONParser]
+    parser_classes=[parsers.MultiPartParser, parsers.FormParser, FastJSONParser]
+    pagination_class=KeysetPagination
+
+    def is_card_view(self):
+        """`GET /api/products/?view=card` lists the denormalized catalog cards."""
+        return self.action == 'list' and self.request.query_params.get('view') == 'card'
+
+    def get_queryset(self):
+        if self.is_card_view():
+            return ProductCard.objects.all()
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.is_card_view():
+            return ProductCardSerializer
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.get_validators(request, 'list', **kwargs),
+            lambda: super(ProductViewSet, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.get_validators(request, 'retrieve', **kwargs),
+            lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs),
+        )
+
+    def get_validators(self, request, kind, pk=None):
+        """
+        ETag/Last-Modified from the row's updated_at, or for a list from the
+        (id, updated_at) of the rows on the requested page (plus the one
+        after it, which decides the next link), read through the pagination
+        index instead of aggregating the whole catalog. Cached alongside the
+        responses: catalog writes move the cache version, so a cached pair
+        always matches the cached body.
+        """
+        def compute():
+            queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+            if kind == 'retrieve':
+                updated = queryset.filter(pk=pk).values_list('updated_at', flat=True).first()
+                if updated is None:
+                    return None
+                return dump_validators(make_validators(request, updated, 1, last_modified=updated))
+            paginator = self.pagination_class()
+            rows = list(paginator.get_page_queryset(queryset, request).values_list('pk', 'updated_at'))
+            parts = [[(row_pk, updated.isoformat()) for row_pk, updated in rows]]
+            if paginator.wants_count(request):
+                parts.append(count_rows(queryset))
+            updated = max((updated for _, updated in rows), default=None)
+            return dump_validators(make_validators(request, *parts, last_modified=updated))
+
+        if kind == 'retrieve' and not str(pk).isdigit():
+            return None
+        key = self.response_cache.make_key('validators', kind, request.build_absolute_uri(),
+                                           request.accepted_renderer.format)
+        data = self.response_cache.get_or_set(key, compute)
+        return load_validators(data) if data is not None else None
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search with brand/category/price facets.
+        GET /api/products/search/?q=...&brand=...&category=...&min_price=...&max_price=...
+        """
+        return self.cached_response(request, 'search', self.run_search)
+
+    def run_search(self, request):
+        for param in ('min_price', 'max_price'):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    finite = Decimal(value).is_finite()
+                except InvalidOperation:
+                    finite = False
+                if not finite:
+                    # NaN/Infinity parse as Decimals but cannot be compared.
+                    return Response({"detail": f"El parámetro {param} debe ser un número."}, status=400)
+        limit = self.pagination_class().get_page_size(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        products, total, facets = search_products(request.query_params.get('q'), request.query_params, limit, queryset)
+        serializer = self.get_serializer(products, many=True)
+        return Response({"count": total, "results": serializer.data, "facets": facets})
 
-class ProductImageViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminOrStaff])
+    def export(self, request):
+        """
+        Stream the whole catalog as CSV or NDJSON.
+        GET /api/products/export/?output=csv|ndjson
+        """
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_CONTENT_TYPES:
+            return Response({"detail": "Formato inválido. Use csv o ndjson."}, status=400)
+        queryset = self.get_queryset()
+        response = streaming_response(
+            request, export_rows(queryset.using(queryset.db), output), EXPORT_CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="productos.{output}"'
+        return response
+
+class ProductImageViewSet(ReplicaReadMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset=ProductImage.objects.all()
     serializer_class=ProductImageSerializer
     permission_classes=[IsAdminOrReadOnly]
@@ -28,10 +152,11 @@ class ProductImageViewSet(viewsets.ModelViewSet):
             return self.queryset.filter(product__id=product_id)
         return self.queryset
     
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(StreamingListMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset=Order.objects.select_related('product').all().order_by('-created_at')
     serializer_class=OrderSerializer
     permission_classes=[IsOwnerOrAdmin, permissions.IsAuthenticated]
+    pagination_class=KeysetPagination
 
     def get_queryset(self):
         user=self.request.user
@@ -79,6 +204,16 @@ class UserViewSet(viewsets.ModelViewSet):
         # Customers only see their own profile
         return User.objects.filter(pk=user.pk)
     
+    @action(detail=True, methods=['post'])
+    def revoke_tokens(self, request, pk=None):
+        """
+        Log a user out everywhere: every token issued so far stops working.
+        POST /api/users/{id}/revoke_tokens/
+        """
+        user = self.get_object()
+        user.revoke_tokens()
+        return Response(status=204)
+
     def get_serializer_context(self):
         """Pass request context to serializer for role validation"""
         context = super().get_serializer_context()
@@ -113,16 +248,36 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(user)
         return Response(serializer.data)
     
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(ConditionalGetMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset= Cart.objects.all()
     serializer_class=CartSerializer
     permission_classes=[permissions.IsAuthenticated, IsOwnerOrAdmin]
     
     def get_queryset(self):
        user=self.request.user
+       queryset=Cart.objects.with_totals()
+       if self.action == 'retrieve':
+        queryset=queryset.with_validators()
        if user.role in ['ADMIN','STAFF']:
-        return Cart.objects.all()
-       return Cart.objects.filter(user=user)
+        return queryset
+       return queryset.filter(user=user)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Like get_object(), but the serializer's prefetches are deferred
+        # until we know the client copy is stale.
+        queryset = self.filter_queryset(self.get_queryset())
+        instance = get_object_or_404(queryset.prefetch_related(None), pk=kwargs[self.lookup_field])
+        self.check_object_permissions(request, instance)
+        last_modified = instance.last_modified
+        validators = make_validators(
+            request, last_modified.isoformat(), instance._lines, instance.total_items, instance.total_price,
+            last_modified=last_modified,
+        )
+
+        def respond():
+            prefetch_related_objects([instance], *queryset._prefetch_related_lookups)
+            return Response(self.get_serializer(instance).data)
+        return self.conditional_response(request, validators, respond)
     
     def create(self, request, *args, **kwargs):
         user=request.user
@@ -139,21 +294,61 @@ class CartViewSet(viewsets.ModelViewSet):
         except (ValueError, TypeError):
             return Response({"detail":"La cantidad debe ser un número válido."}, status=400)
         cart, _= Cart.objects.get_or_create(user=user)
-        product= get_object_or_404(Product, pk=product_id)
-
-        cart_item, created= CartItem.objects.get_or_create(cart=cart, product=product,
-        defaults={'quantity':0, 'current_price':product.price})
-
-        cart_item.quantity+=quantity
-        cart_item.save()
+        try:
+            cart_item, created = add_to_cart(cart, product_id, quantity)
+        except Product.DoesNotExist:
+            raise Http404
+        except OutOfStock as e:
+            return Response({"detail": str(e), "product": e.product_id, "available": e.available}, status=400)
         serializer=CartItemSerializer(cart_item)
         status_code=201 if created else 200
         return Response(serializer.data, status=status_code)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Apply add/set/remove operations to the user's cart in one
+        transaction and return the recomputed cart.
+        POST /api/carts/batch/
+        {"operations": [{"op": "add", "product": 1, "quantity": 2}, {"op": "remove", "product": 3}]}
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        try:
+            apply_cart_operations(cart, serializer.validated_data['operations'])
+        except Product.DoesNotExist as e:
+            return Response({"detail": str(e)}, status=400)
+        except OutOfStock as e:
+            return Response({"detail": str(e), "product": e.product_id, "available": e.available}, status=400)
+        cart = self.filter_queryset(self.get_queryset()).get(pk=cart.pk)
+        return Response(self.get_serializer(cart).data)
+
+    @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        """
+        Turn the user's cart into orders in a single transaction.
+        POST /api/carts/checkout/
+        """
+        try:
+            orders, total_items, total_price = checkout_cart(request.user)
+        except EmptyCart as e:
+            return Response({"detail": str(e)}, status=400)
+        except CartChanged as e:
+            return Response({"detail": str(e)}, status=409)
+        except OutOfStock as e:
+            return Response({"detail": str(e), "product": e.product_id, "available": e.available}, status=400)
+        return Response({
+            "orders": OrderSerializer(orders, many=True).data,
+            "total_items": total_items,
+            "total_price": f"{total_price:.2f}",
+        }, status=201)
     
-class CartItemViewSet(viewsets.ModelViewSet):
+class CartItemViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset=CartItem.objects.select_related('cart', 'product').all()
     serializer_class=CartItemSerializer
     permission_classes=[permissions.IsAuthenticated]
+    pagination_class=KeysetPagination
     
     def get_queryset(self):
        user=self.request.user
@@ -172,18 +367,14 @@ class CartItemViewSet(viewsets.ModelViewSet):
             raise serializers.ValidationError({"quantity":"La cantidad debe ser un número válido."})
         
         cart, _ =Cart.objects.get_or_create(user=user)
-        product= get_object_or_404(Product, pk=product_id)
         try:
-            cart_item=CartItem.objects.get(cart=cart, product=product)
-            cart_item.quantity+=int(quantity)
-            cart_item.save()
-            serializer=self.get_serializer(cart_item)
-            return Response(serializer.data, status=200)
-        except CartItem.DoesNotExist:
-            serializer=self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            serializer.save(cart=cart, product=product, quantity=quantity, current_price=product.price)
-            return Response(serializer.data, status=201)
+            cart_item, created = add_to_cart(cart, product_id, quantity)
+        except Product.DoesNotExist:
+            raise Http404
+        except OutOfStock as e:
+            raise serializers.ValidationError({"quantity": str(e)})
+        serializer=self.get_serializer(cart_item)
+        return Response(serializer.data, status=201 if created else 200)
     
     def perform_update(self, serializer):
         try:
@@ -196,7 +387,8 @@ class CartItemViewSet(viewsets.ModelViewSet):
         self.perform_destroy(instance)
         return Response(status=204)
 
-from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import UserRefreshToken
+from .ratelimit import login_limiter
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -209,14 +401,21 @@ def login_view(request):
 
     if not email or not password:
         return Response({"message": "Email y contraseña son requeridos"}, status=400)
+    if not isinstance(email, str) or not isinstance(password, str):
+        return Response({"message": "Email y contraseña deben ser texto"}, status=400)
 
-    try:
-        user_obj = User.objects.get(email=email)
-        user = authenticate(username=user_obj.username, password=password)
-    except User.DoesNotExist:
-        return Response({"message": "Usuario no encontrado"}, status=404)
+    # Rejected attempts never reach the password hasher.
+    retry_after = login_limiter.check(login_limiter.client_ip(request), email)
+    if retry_after is not None:
+        return Response(
+            {"message": "Demasiados intentos, inténtelo más tarde"},
+            status=429, headers={'Retry-After': str(retry_after)},
+        )
+
+    user = authenticate(request, email=email, password=password)
     if user:
-        refresh = RefreshToken.for_user(user)
+        login_limiter.succeeded(email)
+        refresh = UserRefreshToken.for_user(user)
         return Response({
             "id": user.id,
             "email": user.email,
@@ -229,19 +428,71 @@ def login_view(request):
     else:
         return Response({"message": "Credenciales inválidas"}, status=401)
 
+MONTH_LABELS = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+                "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+
+def period_label(period, granularity):
+    if granularity == 'month':
+        return f"{MONTH_LABELS[period.month - 1]} {period.year}"
+    return period.strftime("%d/%m/%Y")
+
+
 @api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
+@permission_classes([IsAdminOrStaff])
+@replica_reads
 def dashboard_view(request):
     """
-    Mock dashboard data for the frontend charts.
+    Sales dashboard read from the pre-aggregated rollups.
+    GET /api/dashboard/?granularity=month|day&start=YYYY-MM-DD&end=YYYY-MM-DD
+    Defaults to the last 7 periods ending today.
     """
-    data = {
-        "sales": [65, 59, 80, 81, 56, 55, 40],
-        "buys": [28, 48, 40, 19, 86, 27, 90],
-        "stock": [300, 50, 100, 150, 200, 250, 300],
-        "spends": [40, 44, 55, 57, 56, 61, 58],
-        "labels": ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio"]
-    }
+    granularity = request.query_params.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return Response({"detail": "granularity debe ser 'day' o 'month'."}, status=400)
+    try:
+        end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else timezone.localdate()
+        if request.query_params.get('start'):
+            start = date.fromisoformat(request.query_params['start'])
+        else:
+            start = period_start(end, granularity)
+            for _ in range(6):
+                start = previous_period(start, granularity)
+    except ValueError:
+        return Response({"detail": "Las fechas deben tener el formato YYYY-MM-DD."}, status=400)
+    if start > end:
+        return Response({"detail": "start debe ser anterior a end."}, status=400)
+    max_periods = getattr(settings, 'DASHBOARD_MAX_PERIODS', 400)
+    if sum(1 for _ in periods_between(start, end, granularity)) > max_periods:
+        return Response({"detail": f"El rango no puede superar {max_periods} periodos."}, status=400)
+
+    cache_key = f"dashboard:{granularity}:{start.isoformat()}:{end.isoformat()}"
+    data = cache.get(cache_key)
+    if data is None:
+        rows = series(granularity, start, end)
+        data = {
+            "labels": [period_label(period, granularity) for period, _, _, _ in rows],
+            "sales": [float(revenue) for _, _, _, revenue in rows],
+            "buys": [orders for _, orders, _, _ in rows],
+            "units": [units for _, _, units, _ in rows],
+            "categories": [
+                {"name": row['key'], "orders": row['orders'], "units": row['units'], "revenue": float(row['revenue'])}
+                for row in breakdown('category', granularity, start, end)
+            ],
+            "brands": [
+                {"name": row['key'], "orders": row['orders'], "units": row['units'], "revenue": float(row['revenue'])}
+                for row in breakdown('brand', granularity, start, end)
+            ],
+        }
+        cache.set(cache_key, data, getattr(settings, 'DASHBOARD_CACHE_TTL', 60))
     return Response(data)
-    
-        
\ No newline at end of file
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminOrStaff])
+def metrics_view(request):
+    """
+    Request metrics of this process in the Prometheus text format.
+    GET /api/metrics/
+    """
+    return HttpResponse(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')